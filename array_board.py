@@ -0,0 +1,113 @@
+"""
+Boards as NumPy arrays, to score many positions in one call
+
+A board is an int8[64] array indexed like Board.squares (a8 is 0, h1 is 63).
+Empty squares are 0, white pieces 1 to 6 (pawn to king) and black pieces -1 to -6.
+A batch of N boards is an int8[N, 64] array.
+"""
+from board import *
+from evaluation import get_piece_score
+import numpy as np
+
+PIECE_CODES: dict[type, int] = {
+    piece_type: code for code, piece_type in enumerate(PIECE_TYPES, start=1)
+}
+
+# The 12 piece codes, in the order of the columns of the one-hot features
+CODES: np.ndarray = np.array([1, 2, 3, 4, 5, 6, -1, -2, -3, -4, -5, -6], dtype=np.int8)
+SQUARES: np.ndarray = np.arange(64)
+
+
+def get_scores() -> np.ndarray:
+    """Return the score for white of each piece code (row code + 6) on each square"""
+    scores = np.zeros((13, 64), dtype=np.int32)
+    for code in CODES:
+        piece_type: type = PIECE_TYPES[abs(code) - 1]
+        color = Color.WHITE if code > 0 else Color.BLACK
+        sign = 1 if code > 0 else -1
+        for index in range(64):
+            scores[code + 6, index] = sign * get_piece_score(piece_type, color, index)
+    return scores
+
+
+SCORES: np.ndarray = get_scores()
+# The same scores as weights of the one-hot features, float32 sums stay exact below 2 ** 24
+WEIGHTS: np.ndarray = SCORES[CODES.astype(np.intp) + 6].T.reshape(-1).astype(np.float32)
+
+
+def to_array(board: Board) -> np.ndarray:
+    """Return the pieces of the board as an int8[64] array"""
+    array = np.zeros(64, dtype=np.int8)
+    board.ensure_built()
+    for color, sign in ((Color.WHITE, 1), (Color.BLACK, -1)):
+        for piece_type, squares in board.piece_squares[color].items():
+            for pos in squares:
+                array[get_index(pos)] = sign * PIECE_CODES[piece_type]
+    return array
+
+
+def to_arrays(boards: list[Board]) -> np.ndarray:
+    """Return the pieces of many boards as an int8[N, 64] array"""
+    arrays = np.zeros((len(boards), 64), dtype=np.int8)
+    for row, board in enumerate(boards):
+        arrays[row] = to_array(board)
+    return arrays
+
+
+def get_nibble_codes() -> np.ndarray:
+    """Return the piece code of each nibble of the encoding of Board.to_bytes"""
+    codes = np.zeros(16, dtype=np.int8)
+    for nibble, (piece_type, color) in NIBBLE_PIECES.items():
+        codes[nibble] = PIECE_CODES[piece_type] * (1 if color == Color.WHITE else -1)
+    return codes
+
+
+NIBBLE_CODES: np.ndarray = get_nibble_codes()
+
+
+def from_encoded(data: bytes) -> np.ndarray:
+    """Return the pieces of positions encoded by Board.to_bytes, back to back, as int8[N, 64]"""
+    encoded = np.frombuffer(data, dtype=np.uint8).reshape(-1, ENCODED_SIZE)[:, 1:]
+    nibbles = np.stack((encoded >> 4, encoded & 15), axis=2).reshape(-1, 64)
+    return NIBBLE_CODES[nibbles]
+
+
+def to_board(array: np.ndarray, turn: Color = Color.WHITE) -> Board:
+    """Return a Board with the pieces of the array, without castling rights or en passant"""
+    ranks: list[str] = []
+    for row in np.asarray(array).reshape(8, 8):
+        rank = ""
+        empty = 0
+        for code in row:
+            if code == 0:
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            letter: str = FEN_LETTERS[PIECE_TYPES[abs(code) - 1]]
+            rank += letter.upper() if code > 0 else letter
+        ranks.append(rank + (str(empty) if empty else ""))
+    turn_letter = "w" if turn == Color.WHITE else "b"
+    return Board.from_fen(f"{'/'.join(ranks)} {turn_letter} - - 0 1")
+
+
+def get_features(arrays: np.ndarray) -> np.ndarray:
+    """Return the one-hot (square, piece code) features of an [N, 64] batch as float32[N, 768]"""
+    arrays = np.asarray(arrays, dtype=np.int8).reshape(-1, 64)
+    features = arrays[:, :, None] == CODES
+    return features.reshape(len(arrays), -1).astype(np.float32)
+
+
+def evaluate_batch(arrays: np.ndarray) -> np.ndarray:
+    """
+    - Score an [N, 64] batch in centipawns, positive when white is better, as int32[N]
+    - Equal to get_features(arrays) @ WEIGHTS, without building the features
+    """
+    arrays = np.asarray(arrays).reshape(-1, 64)
+    return SCORES[arrays.astype(np.intp) + 6, SQUARES].sum(axis=1, dtype=np.int32)
+
+
+def evaluate_array(array: np.ndarray) -> int:
+    """Score one int8[64] board in centipawns, positive when white is better"""
+    return int(evaluate_batch(array)[0])
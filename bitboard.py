@@ -0,0 +1,410 @@
+"""
+Bitboard position representation and move generation
+
+A second move generator, written independently of board.Board, that perft.py --bitboard uses
+as a test oracle: both have to count the same positions. The game, the engine and the server
+don't use it, and it is not written for speed (piece_at scans every mask and
+get_legal_moves generates all the moves again for each query).
+"""
+from pieces import *
+from typing import Union
+
+# Squares are numbered like Board.squares: index = row * 8 + col, so a8 is 0 and h1 is 63
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+WHITE, BLACK = 0, 1
+
+PIECE_INDEX: dict[type, int] = {
+    Pawn: PAWN,
+    Knight: KNIGHT,
+    Bishop: BISHOP,
+    Rook: ROOK,
+    Queen: QUEEN,
+    King: KING,
+}
+
+# Castling rights bits
+WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE = 1, 2, 4, 8
+
+# Directions as (row step, col step); the first four move towards higher indexes
+POSITIVE_DIRECTIONS: tuple[tuple[int]] = ((1, 0), (0, 1), (1, 1), (1, -1))
+NEGATIVE_DIRECTIONS: tuple[tuple[int]] = ((-1, 0), (0, -1), (-1, -1), (-1, 1))
+ROOK_DIRECTIONS: tuple[tuple[int]] = ((1, 0), (0, 1), (-1, 0), (0, -1))
+BISHOP_DIRECTIONS: tuple[tuple[int]] = ((1, 1), (1, -1), (-1, -1), (-1, 1))
+
+
+def _build_ray(sq: int, direction: tuple[int]) -> int:
+    """Return the squares reached from sq in the given direction on an empty board"""
+    ray = 0
+    row, col = divmod(sq, 8)
+    row += direction[0]
+    col += direction[1]
+    while 0 <= row < 8 and 0 <= col < 8:
+        ray |= 1 << (row * 8 + col)
+        row += direction[0]
+        col += direction[1]
+    return ray
+
+
+def _build_steps(steps: tuple[tuple[int]]) -> list[int]:
+    """Return the attack table of a piece that jumps by the given steps"""
+    table: list[int] = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        for row_step, col_step in steps:
+            if 0 <= row + row_step < 8 and 0 <= col + col_step < 8:
+                mask |= 1 << ((row + row_step) * 8 + col + col_step)
+        table.append(mask)
+    return table
+
+
+RAYS: dict[tuple[int], list[int]] = {
+    direction: [_build_ray(sq, direction) for sq in range(64)]
+    for direction in POSITIVE_DIRECTIONS + NEGATIVE_DIRECTIONS
+}
+KNIGHT_ATTACKS: list[int] = _build_steps(
+    ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+)
+KING_ATTACKS: list[int] = _build_steps(
+    ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+)
+# White pawns move towards row 0, black pawns towards row 7
+PAWN_ATTACKS: tuple[list[int]] = (
+    _build_steps(((-1, -1), (-1, 1))),
+    _build_steps(((1, -1), (1, 1))),
+)
+
+# Clear castling rights when a move touches one of these squares
+CASTLING_MASK: list[int] = [15] * 64
+CASTLING_MASK[60] &= ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE)
+CASTLING_MASK[63] &= ~WHITE_KING_SIDE
+CASTLING_MASK[56] &= ~WHITE_QUEEN_SIDE
+CASTLING_MASK[4] &= ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE)
+CASTLING_MASK[7] &= ~BLACK_KING_SIDE
+CASTLING_MASK[0] &= ~BLACK_QUEEN_SIDE
+
+SQUARE_NAMES: list[str] = [chr(ord("a") + sq % 8) + str(8 - sq // 8) for sq in range(64)]
+
+
+def square_index(pos: str) -> int:
+    """Return the bitboard index of the given square name"""
+    return (8 - int(pos[1])) * 8 + ord(pos[0]) - ord("a")
+
+
+def iter_bits(mask: int):
+    """Yield the index of every set bit of the mask"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def sliding_attacks(sq: int, occupied: int, directions: tuple[tuple[int]]) -> int:
+    """Return the attacks of a sliding piece on sq, stopping at the first blocker"""
+    attacks = 0
+    for direction in directions:
+        ray = RAYS[direction][sq]
+        blockers = ray & occupied
+        if blockers:
+            if direction in POSITIVE_DIRECTIONS:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[direction][first]
+        attacks |= ray
+    return attacks
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return sliding_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return sliding_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def encode_move(from_sq: int, to_sq: int, promotion: int = 0) -> int:
+    """Pack a move into an int: 6 bits from, 6 bits to, then the promotion piece type"""
+    return from_sq | (to_sq << 6) | (promotion << 12)
+
+
+class Position:
+    """
+    A chess position stored as one 64-bit integer per piece type and color.
+    """
+
+    def __init__(self):
+        self.pieces: list[int] = [0] * 12  # Index with color * 6 + piece type
+        self.occupied: list[int] = [0, 0]
+        self.turn: int = WHITE
+        self.castling: int = 0
+        self.en_passant: int = -1  # The square a pawn can capture en passant onto
+
+    @classmethod
+    def from_board(cls, board) -> "Position":
+        """Build a position from a Board, with its side to move, castling rights and en passant"""
+        position = cls()
+        for index, piece in enumerate(board.squares):
+            if piece is not None:
+                position.put(index, PIECE_INDEX[type(piece)], _side(piece.color))
+        turn: Color = board.turn
+        position.turn = _side(turn)
+        # Board keeps the rights with the same bits
+        position.castling = board.get_castling_rights()
+
+        # A pawn of the side that just moved which jumped two squares can be taken en passant
+        pos: Union[str, None] = board.jumped_pos
+        if pos is not None and board.get_piece(pos).color != turn:
+            step = 1 if turn == Color.BLACK else -1
+            position.en_passant = (8 - int(pos[1]) + step) * 8 + ord(pos[0]) - ord("a")
+        return position
+
+    def copy(self) -> "Position":
+        position = Position()
+        position.pieces = self.pieces[:]
+        position.occupied = self.occupied[:]
+        position.turn = self.turn
+        position.castling = self.castling
+        position.en_passant = self.en_passant
+        return position
+
+    def put(self, sq: int, piece_type: int, side: int) -> None:
+        """Put a piece on an empty square"""
+        bit = 1 << sq
+        self.pieces[side * 6 + piece_type] |= bit
+        self.occupied[side] |= bit
+
+    def piece_at(self, sq: int) -> Union[tuple[int], None]:
+        """Return (piece type, side) of the piece on sq"""
+        bit = 1 << sq
+        for index, mask in enumerate(self.pieces):
+            if mask & bit:
+                side, piece_type = divmod(index, 6)
+                return piece_type, side
+        return None
+
+    def is_attacked(self, sq: int, by_side: int) -> bool:
+        """Return True if any piece of by_side attacks sq"""
+        base = by_side * 6
+        pieces = self.pieces
+        if PAWN_ATTACKS[1 - by_side][sq] & pieces[base + PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & pieces[base + KING]:
+            return True
+        occupied = self.occupied[0] | self.occupied[1]
+        queens = pieces[base + QUEEN]
+        if bishop_attacks(sq, occupied) & (pieces[base + BISHOP] | queens):
+            return True
+        if rook_attacks(sq, occupied) & (pieces[base + ROOK] | queens):
+            return True
+        return False
+
+    def king_square(self, side: int) -> int:
+        return self.pieces[side * 6 + KING].bit_length() - 1
+
+    def in_check(self, side: int) -> bool:
+        king = self.pieces[side * 6 + KING]
+        if not king:
+            return False
+        return self.is_attacked(king.bit_length() - 1, 1 - side)
+
+    def pseudo_legal_moves(self, side: int) -> list[int]:
+        """Generate moves without checking whether they leave the king in check"""
+        moves: list[int] = []
+        base = side * 6
+        pieces = self.pieces
+        own = self.occupied[side]
+        enemy = self.occupied[1 - side]
+        occupied = own | enemy
+        empty = ~occupied
+
+        # Pawns
+        forward = -8 if side == WHITE else 8
+        start_row, promotion_row = (6, 0) if side == WHITE else (1, 7)
+        targets = enemy
+        if self.en_passant >= 0:
+            targets |= 1 << self.en_passant
+        for sq in iter_bits(pieces[base + PAWN]):
+            destinations: list[int] = []
+            one = sq + forward
+            if empty >> one & 1:
+                destinations.append(one)
+                two = one + forward
+                if sq // 8 == start_row and empty >> two & 1:
+                    destinations.append(two)
+            destinations.extend(iter_bits(PAWN_ATTACKS[side][sq] & targets))
+            for to_sq in destinations:
+                if to_sq // 8 == promotion_row:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(encode_move(sq, to_sq, promotion))
+                else:
+                    moves.append(sq | (to_sq << 6))
+
+        # Knights and king
+        for piece_type, table in ((KNIGHT, KNIGHT_ATTACKS), (KING, KING_ATTACKS)):
+            for sq in iter_bits(pieces[base + piece_type]):
+                for to_sq in iter_bits(table[sq] & ~own):
+                    moves.append(sq | (to_sq << 6))
+
+        # Sliding pieces
+        for piece_type, directions in (
+            (BISHOP, BISHOP_DIRECTIONS),
+            (ROOK, ROOK_DIRECTIONS),
+            (QUEEN, ROOK_DIRECTIONS + BISHOP_DIRECTIONS),
+        ):
+            for sq in iter_bits(pieces[base + piece_type]):
+                for to_sq in iter_bits(sliding_attacks(sq, occupied, directions) & ~own):
+                    moves.append(sq | (to_sq << 6))
+
+        # Castling, the king may not leave, cross or land on an attacked square
+        if side == WHITE:
+            rights = (
+                (WHITE_KING_SIDE, 60, (61, 62), (61, 62)),
+                (WHITE_QUEEN_SIDE, 60, (59, 58, 57), (59, 58)),
+            )
+        else:
+            rights = (
+                (BLACK_KING_SIDE, 4, (5, 6), (5, 6)),
+                (BLACK_QUEEN_SIDE, 4, (3, 2, 1), (3, 2)),
+            )
+        for right, king_sq, between, passing in rights:
+            if not self.castling & right:
+                continue
+            if any(occupied >> sq & 1 for sq in between):
+                continue
+            if self.is_attacked(king_sq, 1 - side):
+                continue
+            if any(self.is_attacked(sq, 1 - side) for sq in passing):
+                continue
+            moves.append(king_sq | (passing[1] << 6))
+        return moves
+
+    def make_move(self, move: int) -> None:
+        """Play a pseudo-legal move for the side to move"""
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        promotion = move >> 12
+        side = self.turn
+        other = 1 - side
+        pieces = self.pieces
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+
+        piece_type = 0
+        for piece_type in range(6):
+            if pieces[side * 6 + piece_type] & from_bit:
+                break
+
+        # Remove a captured piece
+        if self.occupied[other] & to_bit:
+            for captured in range(6):
+                if pieces[other * 6 + captured] & to_bit:
+                    pieces[other * 6 + captured] ^= to_bit
+                    break
+            self.occupied[other] ^= to_bit
+        elif piece_type == PAWN and to_sq == self.en_passant:
+            captured_bit = 1 << (to_sq + (8 if side == WHITE else -8))
+            pieces[other * 6 + PAWN] ^= captured_bit
+            self.occupied[other] ^= captured_bit
+
+        # Move the piece
+        pieces[side * 6 + piece_type] ^= from_bit
+        pieces[side * 6 + (promotion or piece_type)] |= to_bit
+        self.occupied[side] ^= from_bit | to_bit
+
+        # Move the rook when castling
+        if piece_type == KING and abs(to_sq - from_sq) == 2:
+            rook_from, rook_to = (
+                (from_sq + 3, from_sq + 1)
+                if to_sq > from_sq
+                else (from_sq - 4, from_sq - 1)
+            )
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            pieces[side * 6 + ROOK] ^= rook_bits
+            self.occupied[side] ^= rook_bits
+
+        self.en_passant = -1
+        if piece_type == PAWN and abs(to_sq - from_sq) == 16:
+            self.en_passant = (from_sq + to_sq) // 2
+        self.castling &= CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        self.turn = other
+
+    def save(self) -> tuple:
+        return self.pieces[:], self.occupied[:], self.turn, self.castling, self.en_passant
+
+    def restore(self, state: tuple) -> None:
+        pieces, occupied, self.turn, self.castling, self.en_passant = state
+        self.pieces = pieces[:]
+        self.occupied = occupied[:]
+
+    def legal_moves(self, side: Union[int, None] = None) -> list[int]:
+        """Generate every legal move of the given side (the side to move by default)"""
+        if side is None:
+            side = self.turn
+        state = self.save()
+        self.turn = side
+        moves: list[int] = []
+        for move in self.pseudo_legal_moves(side):
+            self.make_move(move)
+            if not self.in_check(side):
+                moves.append(move)
+            self.restore(state)
+            self.turn = side
+        self.restore(state)
+        return moves
+
+    def perft(self, depth: int) -> int:
+        """Count the leaf nodes of the legal move tree of the given depth"""
+        if depth == 0:
+            return 1
+        side = self.turn
+        state = self.save()
+        nodes = 0
+        for move in self.pseudo_legal_moves(side):
+            self.make_move(move)
+            if not self.in_check(side):
+                nodes += self.perft(depth - 1) if depth > 1 else 1
+            self.restore(state)
+        return nodes
+
+    # The same queries main.py asks Board, using square names
+
+    def get_legal_moves(self, pos: str) -> list[str]:
+        """Return the legal target squares of the piece at pos"""
+        sq = square_index(pos)
+        piece = self.piece_at(sq)
+        if piece is None:
+            return []
+        targets: list[str] = []
+        for move in self.legal_moves(piece[1]):
+            if move & 63 == sq:
+                target = SQUARE_NAMES[(move >> 6) & 63]
+                if target not in targets:
+                    targets.append(target)
+        return targets
+
+    def get_all_legal_moves(self, color: Color) -> list[tuple[str]]:
+        """Return every legal (pos, target) pair of the given color"""
+        moves: list[tuple[str]] = []
+        for move in self.legal_moves(_side(color)):
+            pair = (SQUARE_NAMES[move & 63], SQUARE_NAMES[(move >> 6) & 63])
+            if pair not in moves:
+                moves.append(pair)
+        return moves
+
+    def is_in_check(self, color: Color) -> bool:
+        return self.in_check(_side(color))
+
+    def is_checkmate(self, color: Color) -> bool:
+        side = _side(color)
+        return self.in_check(side) and not self.legal_moves(side)
+
+    def is_stalemate(self, color: Color) -> bool:
+        side = _side(color)
+        return not self.in_check(side) and not self.legal_moves(side)
+
+
+def _side(color: Color) -> int:
+    return WHITE if color == Color.WHITE else BLACK
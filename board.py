@@ -1,5 +1,53 @@
+from evaluation import PHASE_WEIGHTS, PIECE_VALUES, SQUARE_SCORES, Scores
 from pieces import *
-from typing import Union
+from transposition import TranspositionTable
+from itertools import chain
+from typing import NamedTuple, Union
+import random
+import threading
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PROMOTION_TYPES: tuple[type] = (Queen, Rook, Bishop, Knight)
+
+
+class Undo(NamedTuple):
+    """Everything make_move changes, so that unmake_move can put it back"""
+
+    pos: str
+    target: str
+    piece: Piece
+    captured: Union[Piece, None]
+    captured_pos: Union[str, None]  # Differs from target when capturing en passant
+    rook_move: Union[tuple[str], None]  # (rook_pos, rook_target) when castling
+    castling: int
+    jumped_pos: Union[str, None]
+
+
+class CheckInfo(NamedTuple):
+    """What limits the moves of one color in one position, see Board.get_check_info"""
+
+    hash: int
+    color: Color
+    king: int  # Square index of the king, -1 without a king
+    checkers: list[int]  # Indexes of the enemy pieces giving check
+    # Squares that take or block the check, None if no check
+    evasions: Union[set[int], None]
+    pins: dict[int, set[int]]  # Index of a pinned piece: the squares of its pin line
+    king_blocked: set[int]  # Squares behind the king on the line of a checking slider
+
+
+class GameStatus(NamedTuple):
+    """What the side to move faces, worked out from one generation of its legal moves"""
+
+    in_check: bool
+    checkmate: bool
+    stalemate: bool
+    insufficient_material: bool  # Neither side can mate any more
+    moves: list[tuple[str]]  # Every legal (pos, target) move
+
+    @property
+    def is_over(self) -> bool:
+        return self.checkmate or self.stalemate or self.insufficient_material
 
 
 class Board:
@@ -7,36 +55,180 @@ class Board:
     A class that represents a chess board.
     """
 
+    # Shared pieces (see get_shared_piece) or None, by square index (a8 is 0, h1 is 63)
     squares: list
+    castling: int  # Castling rights as bits, see get_castling_rights
+    jumped_pos: Union[str, None]  # Where the pawn that can be captured en passant stands
+    selected: Union[str, None] = None  # The square picked in the window, if any
+    attacks: dict[int, tuple[int]]  # Squares attacked by the piece on each square index
+    attack_counts: dict[Color, list[int]]  # How many pieces of a color attack each square
+    piece_squares: dict[Color, dict[type, set[str]]]  # Where the pieces of each type are
+    turn: Color  # The side to move
+    hash: int  # Zobrist hash of the pieces, side to move, castling rights and en passant
+    # True when a load or copy left out the tables of REBUILT_FIELDS, see ensure_built
+    needs_rebuild: bool = False
+    # The legal moves of each piece, by hash, shared by every board on every thread (the
+    # window, the engine and the speculator). The values only depend on the key, and the table
+    # replaces a slot in one step, so reads need no lock; stores take cache_lock so that two
+    # threads don't interleave the moves between the slots of a bucket.
+    cache: TranspositionTable = TranspositionTable()
+    cache_lock: threading.Lock = threading.Lock()
+    # The legal targets of each piece of the side to move, kept until update()
+    turn_moves: Union[dict[str, list[str]], None] = None
+    turn_moves_hash: int = 0  # The position turn_moves belongs to
+    check_info: Union[CheckInfo, None] = None  # The last get_check_info
+    history: list[
+        tuple
+    ]  # The (pos, target, promote_type) moves of update(), undone ones too
+    undos: list[Union[Undo, None]]  # Of each played move, None where seek jumped over it
+    snapshots: dict[int, bytes]  # to_bytes of the position every SNAPSHOT_EVERY plies
 
-    def __init__(self):
+    def __init__(self, fen: str = START_FEN):
         """
-        Initializes a board with a set of squares.
+        Initializes a board with the position of the FEN string, the starting position by default.
         """
-        self.squares = [[None for _ in range(8)] for _ in range(8)]
-
-        # Initialize the board with pieces
-        self.squares[0][0] = Rook("a8", Color.BLACK)
-        self.squares[0][1] = Knight("b8", Color.BLACK)
-        self.squares[0][2] = Bishop("c8", Color.BLACK)
-        self.squares[0][3] = Queen("d8", Color.BLACK)
-        self.squares[0][4] = King("e8", Color.BLACK)
-        self.squares[0][5] = Bishop("f8", Color.BLACK)
-        self.squares[0][6] = Knight("g8", Color.BLACK)
-        self.squares[0][7] = Rook("h8", Color.BLACK)
-        for i in range(8):
-            self.squares[1][i] = Pawn(chr(ord("a") + i) + "7", Color.BLACK)
-
-        self.squares[7][0] = Rook("a1", Color.WHITE)
-        self.squares[7][1] = Knight("b1", Color.WHITE)
-        self.squares[7][2] = Bishop("c1", Color.WHITE)
-        self.squares[7][3] = Queen("d1", Color.WHITE)
-        self.squares[7][4] = King("e1", Color.WHITE)
-        self.squares[7][5] = Bishop("f1", Color.WHITE)
-        self.squares[7][6] = Knight("g1", Color.WHITE)
-        self.squares[7][7] = Rook("h1", Color.WHITE)
-        for i in range(8):
-            self.squares[6][i] = Pawn(chr(ord("a") + i) + "2", Color.WHITE)
+        self.load_fen(fen)
+
+    @classmethod
+    def from_fen(cls, fen: str) -> "Board":
+        """Create a board from a FEN string"""
+        return cls(fen)
+
+    def load_fen(self, fen: str) -> None:
+        """Set up the position described by a FEN string"""
+        fields: list[str] = fen.split()
+        placement = fields[0]
+        turn = fields[1] if len(fields) > 1 else "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        en_passant = fields[3] if len(fields) > 3 else "-"
+
+        self.squares = list(
+            chain.from_iterable(map(FEN_SQUARES.__getitem__, placement.replace("/", "")))
+        )
+        if len(self.squares) != 64:
+            raise ValueError(f"FEN placement doesn't have 64 squares: {placement}")
+
+        self.set_castling_rights(
+            sum(
+                bit
+                for bit, _, _, _ in CASTLING_SQUARES
+                if get_castling_letter(bit) in castling
+            )
+        )
+
+        self.turn = Color.WHITE if turn == "w" else Color.BLACK
+        self.jumped_pos = None
+        if en_passant != "-":
+            # The pawn that jumped stands just past the en passant square
+            jumped_pos = en_passant[0] + ("4" if en_passant[1] == "3" else "5")
+            if isinstance(self.get_piece(jumped_pos), Pawn):
+                self.jumped_pos = jumped_pos
+        self.hash = self.compute_hash()
+        self.defer_rebuild()
+        self.clear_history()
+
+    def set_castling_rights(self, rights: int) -> None:
+        """Keep the rights of the given bits whose king and rook are on their squares"""
+        self.castling = 0
+        for bit, king_pos, king, rook_pos, rook in CASTLING_PIECES:
+            # The pieces are shared, so comparing them tells their type and color
+            if (
+                rights & bit
+                and self.get_piece(king_pos) is king
+                and self.get_piece(rook_pos) is rook
+            ):
+                self.castling |= bit
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Board":
+        """Create a board from the encoding of to_bytes"""
+        board = cls.__new__(cls)
+        board.load_bytes(data)
+        return board
+
+    def load_bytes(self, data: bytes) -> None:
+        """Set up the position encoded by to_bytes"""
+        self.load_position(data)
+        self.clear_history(bytes(data[:ENCODED_SIZE]))
+
+    def load_position(self, data: bytes) -> None:
+        """Set up the position encoded by to_bytes and keep the history"""
+        header: int = data[0]
+        body: bytes = data[1:ENCODED_SIZE]
+        self.squares = list(chain.from_iterable(map(BYTE_PIECES.__getitem__, body)))
+        self.jumped_pos = None
+        jumped: int = body.translate(JUMPED_BYTES).find(1)
+        if jumped >= 0:
+            high: bool = body[jumped] >> 4 in JUMPED_NIBBLES
+            self.jumped_pos = SQUARE_NAMES[2 * jumped + (0 if high else 1)]
+        self.set_castling_rights(header >> 1 & 15)
+        self.turn = Color.BLACK if header & 1 else Color.WHITE
+        self.hash = self.compute_hash()
+        self.defer_rebuild()
+
+    def to_bytes(self) -> bytes:
+        """
+        - Encode the position in ENCODED_SIZE bytes, for hashing, storage and other processes
+        - The first byte holds the side to move (bit 0) and the castling rights (bits 1 to 4)
+        - Then each byte holds two squares from a8 to h1, one nibble each (see PIECE_NIBBLES)
+        """
+        squares: list = self.squares
+        body = bytearray(map(PAIR_BYTES.__getitem__, zip(squares[::2], squares[1::2])))
+        if self.jumped_pos is not None:
+            index: int = SQUARE_INDEXES[self.jumped_pos]
+            body[index // 2] |= JUMPED_PAWN << (0 if index % 2 else 4)
+        header: int = (self.turn == Color.BLACK) | self.get_castling_rights() << 1
+        return bytes([header]) + body
+
+    def to_fen(self) -> str:
+        """Describe the position as a FEN string, without move counters (always 0 1)"""
+        ranks: list[str] = []
+        for row in range(8):
+            rank = ""
+            empty = 0
+            for col in range(8):
+                piece: Union[Piece, None] = self.squares[row * 8 + col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter: str = FEN_LETTERS[type(piece)]
+                rank += letter.upper() if piece.color == Color.WHITE else letter
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        rights: int = self.get_castling_rights()
+        castling = "".join(
+            get_castling_letter(bit) for bit, _, _, _ in CASTLING_SQUARES if rights & bit
+        )
+        en_passant = "-"
+        if self.jumped_pos is not None:
+            # The square the pawn jumped over
+            pos: str = self.jumped_pos
+            en_passant = pos[0] + ("3" if pos[1] == "4" else "6")
+        turn = "w" if self.turn == Color.WHITE else "b"
+        return f"{'/'.join(ranks)} {turn} {castling or '-'} {en_passant} 0 1"
+
+    def copy(self) -> "Board":
+        """
+        - Return an independent copy of the position: a list of 64 squares, the pieces are shared
+        - Its attack tables are rebuilt when first used and its history starts at this position,
+          so the cost of a copy doesn't grow with the game
+        """
+        board = Board.__new__(Board)
+        board.squares = self.squares[:]
+        board.castling = self.castling
+        board.jumped_pos = self.jumped_pos
+        board.turn = self.turn
+        board.hash = self.hash
+        board.history = []
+        board.undos = []
+        board.snapshots = {}  # update() takes the first one
+        board.defer_rebuild()
+        return board
 
     def __repr__(self):
         """Displays the board."""
@@ -44,7 +236,7 @@ class Board:
         for row in range(8):
             board += f"{8 - row} "
             for col in range(8):
-                piece: Piece = self.squares[row][col]
+                piece: Piece = self.squares[row * 8 + col]
                 if piece is not None:
                     board += f"{piece.symbol} "
                 else:
@@ -55,8 +247,8 @@ class Board:
 
     def get_piece(self, pos: str) -> Union[Piece, None]:
         """Returns the piece at the given position."""
-        row, col = get_row_col(pos)
-        return self.squares[row][col]
+        index: int = SQUARE_INDEXES[pos]
+        return self.squares[index]
 
     def match_color(self, target: str, current_color: Color) -> bool:
         """Returns True if the piece at the given position is of the given color."""
@@ -75,7 +267,7 @@ class Board:
         - Return False if the pawn can't move diagonally.
         """
         pawn: Pawn = self.get_piece(pos)
-        if pawn.move_diagonal(target, color):
+        if pawn.move_diagonal(pos, target, color):
             if not is_active:
                 return target
             if color == Color.WHITE:
@@ -87,12 +279,8 @@ class Board:
                 # Check the en passant case
                 elif int(target[1]) - 1 == 5:  # Which is the only way to en passant
                     en_passant: str = target[0] + str(int(target[1]) - 1)
-                    en_passant_square: Union[Pawn, None] = self.get_piece(en_passant)
-                    if en_passant_square is not None and isinstance(
-                        en_passant_square, Pawn
-                    ):
-                        if en_passant_square.jump and en_passant_square.color != color:
-                            return en_passant
+                    if self.can_take_en_passant(en_passant, color):
+                        return en_passant
                 return False
             else:
                 if self.get_piece(target) is not None:
@@ -100,12 +288,8 @@ class Board:
                         return target
                 elif int(target[1]) + 1 == 4:
                     en_passant: str = target[0] + str(int(target[1]) + 1)
-                    en_passant_square: Union[Pawn, None] = self.get_piece(en_passant)
-                    if en_passant_square is not None and isinstance(
-                        en_passant_square, Pawn
-                    ):
-                        if en_passant_square.jump and en_passant_square.color != color:
-                            return en_passant
+                    if self.can_take_en_passant(en_passant, color):
+                        return en_passant
                 return False
         if not is_active:
             return False
@@ -114,45 +298,62 @@ class Board:
             return False
         return target
 
-    def king_move(
-        self, pos: str, target: str, color: Color, is_active: bool = True
-    ) -> bool:
+    def can_take_en_passant(self, pos: str, color: Color) -> bool:
+        """Return True if a pawn of the given color can take the pawn at pos en passant"""
+        if pos != self.jumped_pos:
+            return False
+        pawn: Union[Piece, None] = self.get_piece(pos)
+        return isinstance(pawn, Pawn) and pawn.color != color
+
+    def can_castle(self, pos: str, target: str) -> bool:
         """
         - This can only be called if the piece at pos is a king.
-        - If the king castles, update the rook position and return True.
-        - If it can't castle return False.
+        - Return True if the king can castle to the target square.
         """
         king: King = self.get_piece(pos)
-        if king.castle(target):
-            if not is_active:
-                return True
-            rook_pos = "a" if target[0] == "c" else "h"
-            rook_target = "d" if target[0] == "c" else "f"
-            if color == Color.WHITE:
-                rook_pos += "1"
-                rook_target += "1"
-            else:
-                rook_pos += "8"
-                rook_target += "8"
-
-            rook: Union[Rook, None] = self.get_piece(rook_pos)
-            if rook is None:
-                return False
-            elif not king.has_castled and not king.in_check and not rook.has_castled:
-                # Update the rook position
-                self.update(rook_pos, rook_target)
-                rook.pos = rook_target
-                return True
+        if pos[0] != "e" or not king.castle(pos, target):
             return False
+        rook_pos = ("a" if target[0] == "c" else "h") + pos[1]
+        if not self.castling & CASTLING_BITS.get((king.color, rook_pos), 0):
+            return False
+        enemy: Color = get_opposite_color(king.color)
+        between = "bcd" if target[0] == "c" else "fg"
+        for letter in between:
+            if self.get_piece(letter + pos[1]) is not None:
+                return False
+        # The king can't castle out of, through or into check
+        passing = "edc" if target[0] == "c" else "efg"
+        for letter in passing:
+            if self.is_attacked(letter + pos[1], enemy):
+                return False
         return True
 
+    def get_valid_moves_for_king(self, pos: str, is_active: bool = True) -> list[str]:
+        """Returns a list of valid squares for the king at the given position."""
+        index: int = get_index(pos)
+        if not is_active:
+            return [SQUARE_NAMES[target] for target in KING_SQUARES[index]]
+        king: King = self.get_piece(pos)
+        self.ensure_built()
+        enemy_attacks: list[int] = self.attack_counts[get_opposite_color(king.color)]
+        valid_squares: list[str] = []
+        for target in KING_SQUARES[index]:
+            if enemy_attacks[target]:
+                continue
+            target_piece: Union[Piece, None] = self.squares[target]
+            if target_piece is None or target_piece.color != king.color:
+                valid_squares.append(SQUARE_NAMES[target])
+        for letter in "cg":
+            if self.can_castle(pos, letter + pos[1]):
+                valid_squares.append(letter + pos[1])
+        return valid_squares
+
     def keep_checking_for_squares(
         self,
         color: Color,
         index: tuple[int],
         direction: tuple[int],
         is_active: bool = True,
-        is_king: bool = False,
     ) -> list[str]:
         """Keep checking valid squares"""
         original_pos: str = get_square_name(*index)
@@ -169,7 +370,7 @@ class Board:
             else:
                 target: str = get_square_name(row_target, col_target)
                 target_piece: Union[Piece, None] = self.get_piece(target)
-                if not self.get_piece(original_pos).can_move(target):
+                if not self.get_piece(original_pos).can_move(original_pos, target):
                     break
                 elif isinstance(self.get_piece(original_pos), Pawn):
                     if self.pawn_move(original_pos, target, color, is_active) is False:
@@ -178,26 +379,7 @@ class Board:
                     if self.match_color(target, color) and is_active:
                         break
                     else:
-                        if is_active and is_king:
-                            if target in self.get_all_valid_moves(
-                                get_opposite_color(self.get_piece(original_pos).color),
-                                is_active=False,
-                            ):
-                                break
                         has_eaten = True
-                if is_active and is_king:
-                    king: King = self.get_piece(original_pos)
-                    if king.castle(target):
-                        if (
-                            self.get_piece("b" + king.pos[1]) is not None
-                            and target == "c" + king.pos[1]
-                        ):
-                            break
-                    if target in self.get_all_valid_moves(
-                        get_opposite_color(self.get_piece(original_pos).color),
-                        is_active=False,
-                    ):
-                        break
                 valid_squares.append(target)
         return valid_squares
 
@@ -209,7 +391,7 @@ class Board:
         for i in range(8):
             for j in range(8):
                 target: str = get_square_name(i, j)
-                if knight.can_move(target):
+                if knight.can_move(pos, target):
                     if is_active:
                         if not self.match_color(target, knight.color):
                             valid_squares.append(target)
@@ -220,12 +402,14 @@ class Board:
     def get_valid_moves(self, pos: str, is_active: bool = True) -> list[str]:
         """
         - Check and return the valid piece's available squares
-        - Only use for piece that isn't a knight
+        - Knights and kings are handled by their own functions
         :param pos: The position of the piece
         :param active: If the piece is the player's piece
         """
         if isinstance(self.get_piece(pos), Knight):
             return self.get_valid_moves_for_knights(pos, is_active)
+        if isinstance(self.get_piece(pos), King):
+            return self.get_valid_moves_for_king(pos, is_active)
         orders: list[list[int]] = [
             [-1, 0],
             [-1, 1],
@@ -239,7 +423,7 @@ class Board:
         row: int
         col: int
         row, col = get_row_col(pos)
-        piece: Piece = self.squares[row][col]
+        piece: Piece = self.squares[row * 8 + col]
         available_squares: list = []
 
         for order in orders:
@@ -248,7 +432,7 @@ class Board:
             if row_order < 0 or row_order > 7 or col_order < 0 or col_order > 7:
                 continue
             target: str = get_square_name(row_order, col_order)
-            if piece.can_move(target):
+            if piece.can_move(pos, target):
                 if isinstance(piece, Pawn):  # Check for en passant case
                     if self.pawn_move(pos, target, piece.color, is_active) is not False:
                         available_squares.extend(
@@ -259,17 +443,6 @@ class Board:
                                 is_active,
                             )
                         )
-                elif isinstance(piece, King):  # Check for castle case
-                    if self.king_move(pos, target, piece.color, is_active):
-                        available_squares.extend(
-                            self.keep_checking_for_squares(
-                                piece.color,
-                                (row, col),
-                                (order[0], order[1]),
-                                is_active,
-                                is_king=True,
-                            )
-                        )
                 else:
                     available_squares.extend(
                         self.keep_checking_for_squares(
@@ -281,115 +454,570 @@ class Board:
                     )
         return available_squares
 
+    def get_legal_moves(self, pos: str) -> list[str]:
+        """Return the moves of the piece at pos that don't leave its king in check"""
+        key: int = self.hash ^ ZOBRIST_QUERIES[get_index(pos)]
+        moves: Union[tuple[str], None] = self.cache.get(key)
+        if moves is None:
+            moves = tuple(self.get_legal_targets(pos, self.get_valid_moves(pos)))
+            with self.cache_lock:
+                self.cache.store(key, moves)
+        return list(moves)
+
+    def get_check_info(self, color: Color) -> CheckInfo:
+        """
+        - Find the checkers, the squares that answer a check and the pinned pieces of a color
+        - One look along the lines from its king, kept until the position changes
+        """
+        self.ensure_built()
+        info: Union[CheckInfo, None] = self.check_info
+        if info is not None and info.hash == self.hash and info.color == color:
+            return info
+        king_pos: Union[str, None] = self.get_king_pos(color)
+        if king_pos is None:
+            info = CheckInfo(self.hash, color, -1, [], None, {}, set())
+            self.check_info = info
+            return info
+
+        king: int = get_index(king_pos)
+        enemy: Color = get_opposite_color(color)
+        checkers: list[int] = [
+            index
+            for index, targets in self.attacks.items()
+            if king in targets and self.squares[index].color == enemy
+        ]
+        lines: dict[int, set[int]] = {}  # Checking slider: the squares up to it
+        pins: dict[int, set[int]] = {}
+        king_blocked: set[int] = set()
+        for rays, sliders in (
+            (ROOK_RAYS[king], (Rook, Queen)),
+            (BISHOP_RAYS[king], (Bishop, Queen)),
+        ):
+            for direction, ray in enumerate(rays):
+                pinned: Union[int, None] = None
+                for step, index in enumerate(ray):
+                    piece: Union[Piece, None] = self.squares[index]
+                    if piece is None:
+                        continue
+                    if piece.color == color:
+                        if pinned is not None:
+                            break  # Two pieces of the color shield the king
+                        pinned = index
+                        continue
+                    if isinstance(piece, sliders):
+                        if pinned is None:
+                            lines[index] = set(ray[: step + 1])
+                            # The king can't step back along the line of the check
+                            behind: tuple[int] = rays[(direction + 2) % 4]
+                            if behind:
+                                king_blocked.add(behind[0])
+                        else:
+                            pins[pinned] = set(ray[: step + 1])
+                    break
+
+        evasions: Union[set[int], None] = None
+        if len(checkers) == 1:
+            evasions = lines.get(checkers[0], {checkers[0]})
+        elif checkers:
+            evasions = set()  # Only the king can answer a double check
+        info = CheckInfo(self.hash, color, king, checkers, evasions, pins, king_blocked)
+        self.check_info = info
+        return info
+
+    def get_legal_targets(self, pos: str, targets: list[str]) -> list[str]:
+        """Keep the targets of the piece at pos that don't leave its king in check"""
+        piece: Piece = self.get_piece(pos)
+        info: CheckInfo = self.get_check_info(piece.color)
+        if isinstance(piece, King):
+            # get_valid_moves_for_king already avoids attacked squares and castling through them
+            return [
+                target
+                for target in targets
+                if SQUARE_INDEXES[target] not in info.king_blocked
+            ]
+        if len(info.checkers) > 1:
+            return []
+        pin: Union[set[int], None] = info.pins.get(get_index(pos))
+        legal: list[str] = []
+        for target in targets:
+            index: int = SQUARE_INDEXES[target]
+            if (
+                isinstance(piece, Pawn)
+                and target[0] != pos[0]
+                and self.squares[index] is None
+            ):
+                if self.is_en_passant_legal(pos, target, info):
+                    legal.append(target)
+                continue
+            if pin is not None and index not in pin:
+                continue
+            if info.evasions is not None and index not in info.evasions:
+                continue
+            legal.append(target)
+        return legal
+
+    def is_en_passant_legal(self, pos: str, target: str, info: CheckInfo) -> bool:
+        """
+        - En passant takes a pawn off a square the move doesn't reach, which can open a line
+          to the king even along the rank of both pawns, so look along every line again
+        """
+        if info.king < 0:
+            return True
+        captured: int = get_index(target[0] + pos[1])
+        end: int = get_index(target)
+        for checker in info.checkers:
+            piece: Piece = self.squares[checker]
+            if checker != captured and not isinstance(piece, (Rook, Bishop, Queen)):
+                return False  # A knight or another pawn still gives check
+        emptied: set[int] = {get_index(pos), captured}
+        for rays, sliders in (
+            (ROOK_RAYS[info.king], (Rook, Queen)),
+            (BISHOP_RAYS[info.king], (Bishop, Queen)),
+        ):
+            for ray in rays:
+                for index in ray:
+                    if index == end:
+                        break
+                    if index in emptied:
+                        continue
+                    piece: Union[Piece, None] = self.squares[index]
+                    if piece is None:
+                        continue
+                    if piece.color != info.color and isinstance(piece, sliders):
+                        return False
+                    break
+        return True
+
+    def get_turn_moves(self) -> dict[str, list[str]]:
+        """
+        - Return the legal targets of every piece of the side to move, by square
+        - Worked out once per turn, so selecting and moving a piece are lookups
+        """
+        if self.turn_moves is None or self.turn_moves_hash != self.hash:
+            self.turn_moves = {
+                pos: self.get_legal_moves(pos)
+                for pos in self.get_piece_positions(self.turn)
+            }
+            self.turn_moves_hash = self.hash  # make_move outside update() also moves on
+        return self.turn_moves
+
+    def get_status(self) -> GameStatus:
+        """Return the status of the side to move, generating its legal moves once"""
+        moves: list[tuple[str]] = [
+            (pos, target)
+            for pos, targets in self.get_turn_moves().items()
+            for target in targets
+        ]
+        in_check: bool = self.can_be_checked(self.turn)
+        return GameStatus(
+            in_check,
+            in_check and not moves,
+            not in_check and not moves,
+            self.has_insufficient_material(),
+            moves,
+        )
+
+    def get_all_legal_moves(self, color: Color) -> list[tuple[str]]:
+        """Return every (pos, target) move of the given color that doesn't leave its king in check"""
+        moves: list[tuple[str]] = []
+        for pos in self.get_piece_positions(color):
+            for target in self.get_legal_targets(pos, self.get_valid_moves(pos)):
+                moves.append((pos, target))
+        return moves
+
+    def get_moves(self, promote_types: tuple[type] = PROMOTION_TYPES) -> list[tuple]:
+        """
+        - Return every legal (pos, target, promote_type) move of the side to move
+        - A promotion comes once per promote type, the turn moves are reused when worked out
+        """
+        if self.turn_moves is not None and self.turn_moves_hash == self.hash:
+            pairs: list[tuple[str]] = [
+                (pos, target)
+                for pos, targets in self.turn_moves.items()
+                for target in targets
+            ]
+        else:
+            pairs = self.get_all_legal_moves(self.turn)
+        moves: list[tuple] = []
+        for pos, target in pairs:
+            piece: Piece = self.get_piece(pos)
+            if isinstance(piece, Pawn) and piece.can_promote(target):
+                moves.extend(
+                    (pos, target, promote_type) for promote_type in promote_types
+                )
+            else:
+                moves.append((pos, target, None))
+        return moves
+
     def update(
-        self,
-        pos: str,
-        target: str,
-        is_pawn: bool = False,
-        do_castle: bool = False,
+        self, pos: str, target: str, promote_type: Union[type, None] = None
     ) -> None:
-        """Update chess board by moving the piece to the target position."""
-        if is_pawn:
-            captured_square = self.pawn_move(pos, target, self.get_piece(pos).color)
-            captured_row, captured_col = get_row_col(captured_square)
-            self.squares[captured_row][captured_col] = None
-        if do_castle:
-            rook_pos = "a" if target[0] == "c" else "h"
-            rook_pos += target[1]
-            rook: Rook = self.get_piece(rook_pos)
-            rook_target = "d" if target[0] == "c" else "f"
-            rook_target += target[1]
-            rook.pos = rook_target
-            rook.has_castled = True
-            self.get_piece(pos).has_castled = True
-            self.update(rook_pos, rook_target)
-
-        pos_row, pos_col = get_row_col(pos)
-        target_row, target_col = get_row_col(target)
-        self.squares[target_row][target_col] = self.squares[pos_row][pos_col]
-        self.squares[pos_row][pos_col] = None
-
-    def get_all_valid_moves(self, color: Color, is_active: bool = True) -> list[str]:
-        """Get all valid moves for the given color"""
-        valid_moves: list[str] = []
-        for row in range(8):
-            for col in range(8):
-                pos: str = get_square_name(row, col)
-                piece: Piece = self.get_piece(pos)
-                if piece is not None and piece.color == color:
-                    valid_moves.extend(self.get_valid_moves(pos, is_active))
-        return list(set(valid_moves))
-
-    def can_check(self, piece: Piece) -> bool:
-        """Check if the given piece can check the opponent king"""
-        piece_moves = self.get_valid_moves(piece.pos)
-        return self.get_king_pos(get_opposite_color(piece.color)) in piece_moves
-
-    def get_king_pos(self, color: Color) -> str:
-        """Get the position of the king of the given color"""
-        for row in range(8):
-            for col in range(8):
-                pos: str = get_square_name(row, col)
-                piece: Piece = self.get_piece(pos)
-                if piece is not None and isinstance(piece, King) and piece.color == color:
-                    return pos
+        """Update chess board by moving the piece to the target position, keeping it in the history"""
+        self.turn_moves = None
+        ply: int = self.ply
+        if ply < len(self.history):  # A new move replaces the moves that were undone
+            del self.history[ply:]
+            self.snapshots = {
+                key: data for key, data in self.snapshots.items() if key <= ply
+            }
+        if 0 not in self.snapshots:  # A copy starts its history without one
+            self.snapshots[0] = self.to_bytes()
+        self.history.append((pos, target, promote_type))
+        self.undos.append(self.make_move(pos, target, promote_type))
+        self.take_snapshot()
+
+    @property
+    def ply(self) -> int:
+        """How many moves of the history are played on the board"""
+        return len(self.undos)
+
+    def clear_history(self, position: Union[bytes, None] = None) -> None:
+        """Start the history from the current position, given as to_bytes if already encoded"""
+        self.history = []
+        self.undos = []
+        self.snapshots = {0: position or self.to_bytes()}
 
-    def move_to_avoid_mate(self, color: Color) -> list[str]:
+    def take_snapshot(self) -> None:
+        """Keep the position if the ply is a multiple of SNAPSHOT_EVERY"""
+        if self.ply % SNAPSHOT_EVERY == 0 and self.ply not in self.snapshots:
+            self.snapshots[self.ply] = self.to_bytes()
+
+    def undo(self) -> bool:
+        """Take back the last played move of the history, return False at the start"""
+        if not self.undos:
+            return False
+        self.seek(self.ply - 1)
+        return True
+
+    def redo(self) -> bool:
+        """Play the next undone move of the history again, return False at the end"""
+        if self.ply == len(self.history):
+            return False
+        self.seek(self.ply + 1)
+        return True
+
+    def seek(self, ply: int) -> None:
         """
-        - Call this function when the opponent king is in check
-        - Return True if the king is mate
+        - Go to the position after the given number of moves of the history
+        - Step through the moves or from the closest snapshot before, whichever is fewer moves,
+          so that at most SNAPSHOT_EVERY moves are played or taken back
         """
-        moves: list[str] = []
-        for row in range(8):
-            for col in range(8):
-                pos: str = get_square_name(row, col)
-                piece: Piece = self.get_piece(pos)
-                if (
-                    piece is not None
-                    and piece.color == color
-                    and not isinstance(piece, King)
-                ):
-                    valid_moves = self.get_valid_moves(pos, is_active=True)
-                    moves.extend(
-                        keep_wanted(
-                            valid_moves, self.move_to_cover_check(piece, valid_moves)
-                        )
-                    )
-        return list(set(moves))
+        ply = max(0, min(ply, len(self.history)))
+        base: int = max((key for key in self.snapshots if key <= ply), default=0)
+        if ply < self.ply:
+            if None in self.undos[ply:] or self.ply - ply > ply - base:
+                self.load_snapshot(base)
+        elif self.ply < base:
+            self.load_snapshot(base)
+        while self.ply > ply:
+            self.unmake_move(self.undos.pop())
+        while self.ply < ply:
+            self.undos.append(self.make_move(*self.history[self.ply]))
+            self.take_snapshot()
+
+    def load_snapshot(self, ply: int) -> None:
+        """Set up the position of the snapshot of the ply, the moves before it stay undoable"""
+        self.load_position(self.snapshots[ply])
+        del self.undos[ply:]
+        self.undos.extend([None] * (ply - len(self.undos)))
+
+    def make_move(
+        self, pos: str, target: str, promote_type: Union[type, None] = None
+    ) -> Undo:
+        """
+        - Move the piece at pos to target, capturing en passant, castling and promoting as needed
+        - Return the record that unmake_move needs to take the move back
+        """
+        self.ensure_built()
+        piece: Piece = self.get_piece(pos)
+        captured_pos: Union[str, None] = target
+        rook_move: Union[tuple[str], None] = None
+        rook: Union[Rook, None] = None
+        if (
+            isinstance(piece, Pawn)
+            and pos[0] != target[0]
+            and self.get_piece(target) is None
+        ):
+            captured_pos = target[0] + pos[1]  # En passant
+        elif isinstance(piece, King) and piece.castle(pos, target):
+            rook_pos = ("a" if target[0] == "c" else "h") + target[1]
+            rook_target = ("d" if target[0] == "c" else "f") + target[1]
+            if isinstance(self.get_piece(rook_pos), Rook):
+                rook = self.get_piece(rook_pos)
+                rook_move = (rook_pos, rook_target)
+        captured: Union[Piece, None] = self.get_piece(captured_pos)
+        if captured is None:
+            captured_pos = None
+
+        undo = Undo(
+            pos,
+            target,
+            piece,
+            captured,
+            captured_pos,
+            rook_move,
+            self.castling,
+            self.jumped_pos,
+        )
+
+        self.hash ^= self.get_state_key()
+        changes: list[tuple] = []
+        if captured_pos is not None:
+            changes.append((captured_pos, None))
+        changes.append((pos, None))
+        if promote_type is not None:
+            changes.append((target, get_shared_piece(promote_type, piece.color)))
+        else:
+            changes.append((target, piece))
+        if rook is not None:
+            changes.append((rook_move[0], None))
+            changes.append((rook_move[1], rook))
+        self.set_squares(changes)
+        # A king or rook that moves, or a rook that is taken, loses its castling rights
+        self.castling &= ~(CASTLING_MASKS.get(pos, 0) | CASTLING_MASKS.get(target, 0))
+
+        # Only the pawn that has just jumped can be captured en passant
+        self.jumped_pos = None
+        if isinstance(piece, Pawn) and abs(int(target[1]) - int(pos[1])) == 2:
+            self.jumped_pos = target
+
+        self.turn = get_opposite_color(self.turn)
+        self.hash ^= self.get_state_key() ^ ZOBRIST_TURN
+        return undo
+
+    def unmake_move(self, undo: Undo) -> None:
+        """Take back a move played by make_move"""
+        self.hash ^= self.get_state_key() ^ ZOBRIST_TURN
+        self.turn = get_opposite_color(self.turn)
+        changes: list[tuple] = [(undo.target, None), (undo.pos, undo.piece)]
+        if undo.captured_pos is not None:
+            changes.append((undo.captured_pos, undo.captured))
+        if undo.rook_move is not None:
+            rook_pos, rook_target = undo.rook_move
+            changes.append((rook_target, None))
+            changes.append((rook_pos, self.get_piece(rook_target)))
+        self.set_squares(changes)
+        self.castling = undo.castling
+        self.jumped_pos = undo.jumped_pos
+        self.hash ^= self.get_state_key()
+
+    def set_piece(self, pos: str, piece: Union[Piece, None]) -> None:
+        """Put the piece (or nothing) on the given square."""
+        self.squares[SQUARE_INDEXES[pos]] = piece
+
+    def set_squares(self, changes: list[tuple]) -> None:
+        """
+        - Put pieces (or nothing) on several squares, given as (pos, piece) pairs in order
+        - Keep the attack tables, piece lists, hash and scores up to date
+        """
+        changed: set[int] = {get_index(pos) for pos, _ in changes}
+        # A sliding piece attacks different squares once a square on its rays changes
+        sliders: list[int] = [
+            index
+            for index, targets in self.attacks.items()
+            if index not in changed
+            and not changed.isdisjoint(targets)
+            and isinstance(self.squares[index], (Rook, Bishop, Queen))
+        ]
+        for index in sliders:
+            self.remove_attacks(index)
+        for index in changed:
+            if index in self.attacks:
+                self.remove_attacks(index)
+        for pos, piece in changes:
+            index: int = get_index(pos)
+            old_piece: Union[Piece, None] = self.squares[index]
+            if old_piece is not None:
+                self.piece_squares[old_piece.color][type(old_piece)].discard(pos)
+                self.hash ^= ZOBRIST_PIECES[old_piece.symbol][index]
+                self.material[old_piece.color] -= PIECE_VALUES[type(old_piece)]
+                self.square_scores[old_piece.color] -= SQUARE_SCORES[old_piece.symbol][
+                    index
+                ]
+                self.phase -= PHASE_WEIGHTS[type(old_piece)]
+            self.set_piece(pos, piece)
+            if piece is not None:
+                self.piece_squares[piece.color][type(piece)].add(pos)
+                self.hash ^= ZOBRIST_PIECES[piece.symbol][index]
+                self.material[piece.color] += PIECE_VALUES[type(piece)]
+                self.square_scores[piece.color] += SQUARE_SCORES[piece.symbol][index]
+                self.phase += PHASE_WEIGHTS[type(piece)]
+        for index in sliders:
+            self.add_attacks(index)
+        for index in changed:
+            if self.squares[index] is not None:
+                self.add_attacks(index)
+
+    def get_attacks(self, index: int, piece: Piece) -> tuple[int]:
+        """Return the indexes of the squares the given piece on the given index attacks"""
+        if isinstance(piece, Pawn):
+            return PAWN_CAPTURES[piece.color][index]
+        elif isinstance(piece, Knight):
+            return KNIGHT_SQUARES[index]
+        elif isinstance(piece, King):
+            return KING_SQUARES[index]
+        elif isinstance(piece, Rook):
+            rays = ROOK_RAYS[index]
+        elif isinstance(piece, Bishop):
+            rays = BISHOP_RAYS[index]
+        else:
+            rays = ROOK_RAYS[index] + BISHOP_RAYS[index]
+        targets: list[int] = []
+        for ray in rays:
+            for target in ray:
+                targets.append(target)
+                if self.squares[target] is not None:
+                    break
+        return tuple(targets)
+
+    def add_attacks(self, index: int) -> None:
+        """Count the attacks of the piece on the given index"""
+        piece: Piece = self.squares[index]
+        targets: tuple[int] = self.get_attacks(index, piece)
+        self.attacks[index] = targets
+        counts: list[int] = self.attack_counts[piece.color]
+        for target in targets:
+            counts[target] += 1
+
+    def remove_attacks(self, index: int) -> None:
+        """Stop counting the attacks of the piece on the given index"""
+        piece: Piece = self.squares[index]
+        counts: list[int] = self.attack_counts[piece.color]
+        for target in self.attacks.pop(index):
+            counts[target] -= 1
+
+    def get_castling_rights(self) -> int:
+        """Return the castling rights as bits: white king side, white queen side, black king side, black queen side"""
+        return self.castling
+
+    def get_state_key(self) -> int:
+        """Return the part of the hash for castling rights and en passant"""
+        key: int = ZOBRIST_CASTLING[self.get_castling_rights()]
+        if self.jumped_pos is not None:
+            key ^= ZOBRIST_EN_PASSANT[ord(self.jumped_pos[0]) - ord("a")]
+        return key
+
+    def compute_hash(self) -> int:
+        """Compute the Zobrist hash of the board from scratch"""
+        key: int = self.get_state_key()
+        if self.turn == Color.BLACK:
+            key ^= ZOBRIST_TURN
+        for index in range(64):
+            piece: Union[Piece, None] = self.squares[index]
+            if piece is not None:
+                key ^= ZOBRIST_PIECES[piece.symbol][index]
+        return key
+
+    def compute_scores(self) -> Scores:
+        """Add up the material, piece-square bonuses and phase of the board from scratch"""
+        scores = Scores(
+            {Color.WHITE: 0, Color.BLACK: 0}, {Color.WHITE: 0, Color.BLACK: 0}, 0
+        )
+        phase = 0
+        for index in range(64):
+            piece: Union[Piece, None] = self.squares[index]
+            if piece is not None:
+                scores.material[piece.color] += PIECE_VALUES[type(piece)]
+                scores.squares[piece.color] += SQUARE_SCORES[piece.symbol][index]
+                phase += PHASE_WEIGHTS[type(piece)]
+        return scores._replace(phase=phase)
+
+    def get_scores(self) -> Scores:
+        """Return the running material, piece-square and phase scores, kept by set_squares"""
+        self.ensure_built()
+        return Scores(dict(self.material), dict(self.square_scores), self.phase)
+
+    def get_score(self) -> int:
+        """Return the running score of the board in centipawns, positive when white is better"""
+        self.ensure_built()
+        return (
+            self.material[Color.WHITE]
+            - self.material[Color.BLACK]
+            + self.square_scores[Color.WHITE]
+            - self.square_scores[Color.BLACK]
+        )
 
-    def move_to_cover_check(self, piece: Piece, piece_moves: list[str]) -> list[str]:
+    def rebuild(self) -> None:
+        """Recompute the piece lists, attack tables, hash and scores from the squares"""
+        self.piece_squares = {
+            color: {piece_type: set() for piece_type in PIECE_TYPES}
+            for color in (Color.WHITE, Color.BLACK)
+        }
+        for index in range(64):
+            piece: Union[Piece, None] = self.squares[index]
+            if piece is not None:
+                self.piece_squares[piece.color][type(piece)].add(SQUARE_NAMES[index])
+        self.rebuild_attacks()
+        self.hash = self.compute_hash()
+        self.material, self.square_scores, self.phase = self.compute_scores()
+        self.needs_rebuild = False
+
+    def defer_rebuild(self) -> None:
+        """Drop the tables of REBUILT_FIELDS until ensure_built needs them, the hash is kept"""
+        for name in REBUILT_FIELDS:
+            self.__dict__.pop(name, None)
+        self.needs_rebuild = True
+
+    def ensure_built(self) -> None:
         """
-        - Check if the given piece can cover the opponent king
-        - Return list of moves that it can cover
+        - Rebuild the tables a load or copy left out, called where they are first read
+        - So a board that is only hashed, encoded or looked up in a cache never pays for them
         """
-        moves_can_cover: list[str] = []
-        for move in piece_moves:
-            copy_of_board: Board = generate_cases(self.squares, Board())
-            copy_of_board.update(piece.pos, move)
-            if not copy_of_board.can_be_checked(piece.color):
-                moves_can_cover.append(move)
-        return moves_can_cover
+        if self.needs_rebuild:
+            self.rebuild()
+
+    def get_piece_positions(
+        self, color: Color, piece_type: Union[type, None] = None
+    ) -> list[str]:
+        """Return the squares of the pieces of the given color, only of the given type if one is given"""
+        self.ensure_built()
+        if piece_type is not None:
+            return list(self.piece_squares[color][piece_type])
+        positions: list[str] = []
+        for squares in self.piece_squares[color].values():
+            positions.extend(squares)
+        return positions
+
+    def rebuild_attacks(self) -> None:
+        """Recount every attack on the board from scratch"""
+        self.attacks = {}
+        self.attack_counts = {Color.WHITE: [0] * 64, Color.BLACK: [0] * 64}
+        for index in range(64):
+            if self.squares[index] is not None:
+                self.add_attacks(index)
+
+    def is_attacked(self, pos: str, color: Color) -> bool:
+        """Return True if any piece of the given color attacks the given square"""
+        self.ensure_built()
+        return self.attack_counts[color][get_index(pos)] > 0
+
+    def can_check(self, pos: str) -> bool:
+        """Check if the piece at pos can check the opponent king"""
+        piece: Piece = self.get_piece(pos)
+        king_pos: Union[str, None] = self.get_king_pos(get_opposite_color(piece.color))
+        if king_pos is None:
+            return False
+        return get_index(king_pos) in self.attacks[get_index(pos)]
+
+    def get_king_pos(self, color: Color) -> Union[str, None]:
+        """Get the position of the king of the given color"""
+        self.ensure_built()
+        for pos in self.piece_squares[color][King]:
+            return pos
+        return None
 
     def can_be_checked(self, color: Color) -> bool:
         """
         - Check if the given color can be check
         - Return True if it can
         """
-        for row in range(8):
-            for col in range(8):
-                pos: str = get_square_name(row, col)
-                piece: Piece = self.get_piece(pos)
-                if piece is not None and piece.color != color:
-                    if self.can_check(piece):
-                        return True
-        return False
+        king_pos: Union[str, None] = self.get_king_pos(color)
+        if king_pos is None:
+            return False
+        return self.is_attacked(king_pos, get_opposite_color(color))
 
-    def stalemate(self, color: Color) -> bool:
-        """
-        - Call this function when the opponent king is not in check
-        """
-        if len(self.get_all_valid_moves(color)) == 0:
-            return True
+    def has_insufficient_material(self) -> bool:
+        """Return True if only kings are left, with one bishop or knight or one each of a kind"""
         num_of_pieces: int = self.count_piece_on_board()
         if num_of_pieces <= 2:
             return True
@@ -410,54 +1038,25 @@ class Board:
     def get_pieces_not_king(self, num_pieces: int) -> list[Piece]:
         """Return a list of pieces with given length that is not a king"""
         pieces: list[Piece] = []
-        for row in range(8):
-            for col in range(8):
-                if len(pieces) == num_pieces:
-                    return pieces
-                pos: str = get_square_name(row, col)
-                piece: Piece = self.get_piece(pos)
-                if piece is not None and not isinstance(piece, King):
-                    pieces.append(piece)
+        for color in (Color.WHITE, Color.BLACK):
+            for piece_type, squares in self.piece_squares[color].items():
+                if piece_type is King:
+                    continue
+                for pos in squares:
+                    if len(pieces) == num_pieces:
+                        return pieces
+                    pieces.append(self.get_piece(pos))
         return pieces
 
     def count_piece_on_board(self) -> int:
         """Return the number of pieces on the board"""
+        self.ensure_built()
         count = 0
-        for row in range(8):
-            for col in range(8):
-                if self.squares[row][col] is not None:
-                    count += 1
+        for color in (Color.WHITE, Color.BLACK):
+            for squares in self.piece_squares[color].values():
+                count += len(squares)
         return count
 
-    def get_checked_when_move(self, piece: Piece, target: str) -> bool:
-        """Check if the given piece moves to the target, the king with the corresponding color is checked or not"""
-        copy_of_board: Board = generate_cases(self.squares, Board())
-        copy_of_board.update(piece.pos, target, is_pawn=isinstance(piece, Pawn))
-        if copy_of_board.can_be_checked(piece.color):
-            return True
-        return False
-
-    def moves_to_not_in_check(self, piece: Piece, piece_moves: list[str]) -> list[str]:
-        """
-        - Check if the given piece can move to the target and the king with the corresponding color is not in check
-        - Return list of moves that it can move to
-        """
-        moves_can_move: list[str] = []
-        for move in piece_moves:
-            copy_of_board: Board = generate_cases(self.squares, Board())
-            copy_of_board.update(piece.pos, move, is_pawn=isinstance(piece, Pawn))
-            if not copy_of_board.can_be_checked(piece.color):
-                moves_can_move.append(move)
-        return moves_can_move
-
-
-def generate_cases(squares: list[Piece], board: Board) -> Board:
-    """Generate chess cases"""
-    for row in range(8):
-        for col in range(8):
-            board.squares[row][col] = squares[row][col]
-    return board
-
 
 def get_row_col(pos: str) -> tuple[int]:
     """Returns the row and column of the given position."""
@@ -471,6 +1070,33 @@ def get_square_name(row: int, col: int) -> str:
     return chr(ord("a") + col) + str(8 - row)
 
 
+def get_index(pos: str) -> int:
+    """Returns the index (row * 8 + col) of the given position."""
+    return SQUARE_INDEXES[pos]
+
+
+def get_move_name(pos: str, target: str, promote_type: Union[type, None] = None) -> str:
+    """Name a move like e2e4 or e7e8q"""
+    if promote_type is None:
+        return pos + target
+    return pos + target + FEN_LETTERS[promote_type]
+
+
+def get_castling_letter(bit: int) -> str:
+    """Return the FEN letter of a castling right bit"""
+    return "KQkq"[bit.bit_length() - 1]
+
+
+def decode_position(data: bytes) -> tuple[Color, int, list[int]]:
+    """Return the side to move, castling rights and 64 square nibbles of a to_bytes encoding"""
+    header: int = data[0]
+    nibbles: list[int] = []
+    for byte in data[1:ENCODED_SIZE]:
+        nibbles.append(byte >> 4)
+        nibbles.append(byte & 15)
+    return Color.BLACK if header & 1 else Color.WHITE, header >> 1 & 15, nibbles
+
+
 def get_opposite_color(color: Color) -> Color:
     """Get the opposite color of the given color"""
     if color == Color.WHITE:
@@ -479,6 +1105,162 @@ def get_opposite_color(color: Color) -> Color:
         return Color.WHITE
 
 
-def keep_wanted(moves: list[str], wanted: list[str]) -> list[str]:
-    """Keep wanted moves from the given list of moves"""
-    return [move for move in moves if move in wanted]
+def get_squares_by_steps(steps: tuple[tuple[int]]) -> list[tuple[int]]:
+    """For every square index, the indexes reached by one of the (row, col) steps"""
+    table: list[tuple[int]] = []
+    for index in range(64):
+        row, col = divmod(index, 8)
+        table.append(
+            tuple(
+                (row + row_step) * 8 + col + col_step
+                for row_step, col_step in steps
+                if 0 <= row + row_step < 8 and 0 <= col + col_step < 8
+            )
+        )
+    return table
+
+
+def get_rays(directions: tuple[tuple[int]]) -> list[tuple[tuple[int]]]:
+    """For every square index, the indexes along each direction until the edge of the board"""
+    table: list[tuple[tuple[int]]] = []
+    for index in range(64):
+        rays: list[tuple[int]] = []
+        for row_step, col_step in directions:
+            row, col = divmod(index, 8)
+            ray: list[int] = []
+            row += row_step
+            col += col_step
+            while 0 <= row < 8 and 0 <= col < 8:
+                ray.append(row * 8 + col)
+                row += row_step
+                col += col_step
+            rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return table
+
+
+PIECE_TYPES: tuple[type] = (Pawn, Knight, Bishop, Rook, Queen, King)
+FEN_PIECES: dict[str, type] = {
+    "p": Pawn,
+    "n": Knight,
+    "b": Bishop,
+    "r": Rook,
+    "q": Queen,
+    "k": King,
+}
+FEN_LETTERS: dict[type, str] = {value: key for key, value in FEN_PIECES.items()}
+# The squares each character of a FEN rank stands for: one shared piece or a run of empty ones
+FEN_SQUARES: dict[str, tuple] = {
+    **{
+        letter.upper() if color == Color.WHITE else letter: (
+            get_shared_piece(piece_type, color),
+        )
+        for letter, piece_type in FEN_PIECES.items()
+        for color in (Color.WHITE, Color.BLACK)
+    },
+    **{str(count): (None,) * count for count in range(1, 9)},
+}
+SQUARE_NAMES: list[str] = [get_square_name(index // 8, index % 8) for index in range(64)]
+SQUARE_INDEXES: dict[str, int] = {name: index for index, name in enumerate(SQUARE_NAMES)}
+KNIGHT_SQUARES: list[tuple[int]] = get_squares_by_steps(
+    ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+)
+KING_SQUARES: list[tuple[int]] = get_squares_by_steps(
+    ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+)
+PAWN_CAPTURES: dict[Color, list[tuple[int]]] = {
+    Color.WHITE: get_squares_by_steps(((-1, -1), (-1, 1))),
+    Color.BLACK: get_squares_by_steps(((1, -1), (1, 1))),
+}
+ROOK_RAYS: list[tuple[tuple[int]]] = get_rays(((-1, 0), (0, 1), (1, 0), (0, -1)))
+BISHOP_RAYS: list[tuple[tuple[int]]] = get_rays(((-1, 1), (1, 1), (1, -1), (-1, -1)))
+CASTLING_SQUARES: tuple[tuple] = (
+    (1, "e1", "h1", Color.WHITE),
+    (2, "e1", "a1", Color.WHITE),
+    (4, "e8", "h8", Color.BLACK),
+    (8, "e8", "a8", Color.BLACK),
+)
+# The same with the shared king and rook that must stand on those squares
+CASTLING_PIECES: tuple[tuple] = tuple(
+    (
+        bit,
+        king_pos,
+        get_shared_piece(King, color),
+        rook_pos,
+        get_shared_piece(Rook, color),
+    )
+    for bit, king_pos, rook_pos, color in CASTLING_SQUARES
+)
+# The right of each color to castle with the rook on a square
+CASTLING_BITS: dict[tuple[Color, str], int] = {
+    (color, rook_pos): bit for bit, _, rook_pos, color in CASTLING_SQUARES
+}
+# The rights lost when a piece moves from or to a square
+CASTLING_MASKS: dict[str, int] = {
+    pos: sum(
+        bit
+        for bit, king_pos, rook_pos, _ in CASTLING_SQUARES
+        if pos in (king_pos, rook_pos)
+    )
+    for pos in ("e1", "h1", "a1", "e8", "h8", "a8")
+}
+
+# Plies between two positions kept by the history of Board
+SNAPSHOT_EVERY = 32
+
+# Binary encoding of Board.to_bytes: a header byte, then a nibble per square.
+# Pawn to king are 1 to 6, black pieces add 8, and a pawn that can be captured en passant
+# also sets JUMPED_PAWN (7 for white, 15 for black).
+ENCODED_SIZE = 33
+JUMPED_PAWN = 6
+PIECE_NIBBLES: dict[str, int] = {
+    side + FEN_LETTERS[piece_type].upper(): code + (8 if side == "b" else 0)
+    for code, piece_type in enumerate(PIECE_TYPES, start=1)
+    for side in "wb"
+}
+NIBBLE_PIECES: dict[int, tuple] = {
+    code + (8 if color == Color.BLACK else 0): (piece_type, color)
+    for code, piece_type in enumerate(PIECE_TYPES, start=1)
+    for color in (Color.WHITE, Color.BLACK)
+}
+NIBBLE_PIECES[1 | JUMPED_PAWN] = (Pawn, Color.WHITE)
+NIBBLE_PIECES[9 | JUMPED_PAWN] = (Pawn, Color.BLACK)
+JUMPED_NIBBLES: tuple[int] = (1 | JUMPED_PAWN, 9 | JUMPED_PAWN)
+# The two shared pieces (or None) of each byte value
+BYTE_PIECES: list[tuple] = [
+    tuple(
+        get_shared_piece(*NIBBLE_PIECES[nibble]) if nibble in NIBBLE_PIECES else None
+        for nibble in (byte >> 4, byte & 15)
+    )
+    for byte in range(256)
+]
+# The byte of each pair of pieces, the lowest one so that no pawn is marked as jumped
+PAIR_BYTES: dict[tuple, int] = {
+    pair: byte for byte, pair in reversed(list(enumerate(BYTE_PIECES)))
+}
+# 1 for the byte values that hold a jumped pawn, found with bytes.translate
+JUMPED_BYTES: bytes = bytes(
+    byte >> 4 in JUMPED_NIBBLES or byte & 15 in JUMPED_NIBBLES for byte in range(256)
+)
+# The attributes Board.rebuild works out from the squares, left out until ensure_built
+REBUILT_FIELDS: tuple[str] = (
+    "piece_squares",
+    "attacks",
+    "attack_counts",
+    "material",
+    "square_scores",
+    "phase",
+)
+
+# Zobrist keys, seeded so that hashes are the same in every run
+_zobrist_random = random.Random(20220101)
+ZOBRIST_PIECES: dict[str, list[int]] = {
+    color + letter: [_zobrist_random.getrandbits(64) for _ in range(64)]
+    for color in "wb"
+    for letter in "PNBRQK"
+}
+ZOBRIST_TURN: int = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING: list[int] = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EN_PASSANT: list[int] = [_zobrist_random.getrandbits(64) for _ in range(8)]
+# Mixed into the hash to tell the cached legal moves of each square apart
+ZOBRIST_QUERIES: list[int] = [_zobrist_random.getrandbits(64) for _ in range(64)]
@@ -0,0 +1,214 @@
+"""
+Opening books: sorted files of 16-byte (key, move, weight, learn) entries, like Polyglot
+
+The file is memory-mapped and searched by binary search, so opening a book is instant and
+only the pages that are looked at are read. Keys are the Board.hash Zobrist keys of this
+game, not the official Polyglot keys, so books must be built with this module.
+
+Examples:
+    python book.py build games.pgn --output book.bin --plies 20
+    python book.py probe book.bin --fen "<FEN>"
+"""
+from board import *
+from typing import Iterable, NamedTuple
+import argparse
+import pgn
+import mmap
+import os
+import random
+import struct
+
+ENTRY = struct.Struct(">QHHI")  # key, move, weight, learn
+KEY = struct.Struct(">Q")
+BOOK_PATH: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
+# Promotion piece of the move encoding, from bit 12
+PROMOTION_CODES: dict[type, int] = {Knight: 1, Bishop: 2, Rook: 3, Queen: 4}
+CODE_PROMOTIONS: dict[int, type] = {
+    code: piece_type for piece_type, code in PROMOTION_CODES.items()
+}
+
+
+class BookEntry(NamedTuple):
+    key: int
+    move: int
+    weight: int
+    learn: int
+
+
+class OpeningBook:
+    """A book file opened with mmap, entries sorted by key"""
+
+    def __init__(self, path: str = BOOK_PATH):
+        self.path = path
+        self.file = open(path, "rb")
+        size: int = os.fstat(self.file.fileno()).st_size
+        self.size: int = size // ENTRY.size
+        # An empty file can't be mapped
+        self.data: Union[mmap.mmap, bytes] = (
+            mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> "OpeningBook":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def find(self, key: int) -> int:
+        """Return the index of the first entry with the key or a greater one"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get_entries(self, key: int) -> list[BookEntry]:
+        """Return the entries of the position with the given key"""
+        entries: list[BookEntry] = []
+        for index in range(self.find(key), self.size):
+            entry = BookEntry(*ENTRY.unpack_from(self.data, index * ENTRY.size))
+            if entry.key != key:
+                break
+            entries.append(entry)
+        return entries
+
+    def get_moves(self, board: Board) -> list[tuple[tuple, int]]:
+        """Return the legal ((pos, target, promote_type), weight) moves of the book for the board"""
+        moves: list[tuple[tuple, int]] = []
+        for entry in self.get_entries(board.hash):
+            move: tuple = decode_move(board, entry.move)
+            pos, target, _ = move
+            piece: Union[Piece, None] = board.get_piece(pos)
+            if piece is None or piece.color != board.turn:
+                continue  # A key collision
+            if target in board.get_legal_moves(pos):
+                moves.append((move, entry.weight))
+        return moves
+
+    def get_best_move(self, board: Board) -> Union[tuple, None]:
+        """Return the move of the book with the highest weight, None out of book"""
+        moves: list[tuple[tuple, int]] = self.get_moves(board)
+        if not moves:
+            return None
+        return max(moves, key=lambda item: item[1])[0]
+
+    def choose_move(
+        self, board: Board, rng: Union[random.Random, None] = None
+    ) -> Union[tuple, None]:
+        """Pick a move of the book at random in proportion to its weight, None out of book"""
+        moves: list[tuple[tuple, int]] = [
+            item for item in self.get_moves(board) if item[1]
+        ]
+        if not moves:
+            return None
+        weights: list[int] = [weight for _, weight in moves]
+        return (rng or random).choices([move for move, _ in moves], weights)[0]
+
+
+def open_book(path: str = BOOK_PATH) -> Union[OpeningBook, None]:
+    """Open the book if the file exists"""
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def encode_move(board: Board, move: tuple) -> int:
+    """
+    - Pack a move into 16 bits: to file, to rank, from file, from rank (3 bits each), promotion
+    - Castling is written as the king taking its own rook, like Polyglot
+    """
+    pos, target, promote_type = move
+    if isinstance(board.get_piece(pos), King) and abs(ord(target[0]) - ord(pos[0])) == 2:
+        target = ("h" if target[0] == "g" else "a") + target[1]
+    code: int = ord(target[0]) - ord("a") | (int(target[1]) - 1) << 3
+    code |= (ord(pos[0]) - ord("a")) << 6 | (int(pos[1]) - 1) << 9
+    if promote_type is not None:
+        code |= PROMOTION_CODES[promote_type] << 12
+    return code
+
+
+def decode_move(board: Board, code: int) -> tuple:
+    """Return the (pos, target, promote_type) move of a 16-bit code on the board"""
+    target: str = "abcdefgh"[code & 7] + str((code >> 3 & 7) + 1)
+    pos: str = "abcdefgh"[code >> 6 & 7] + str((code >> 9 & 7) + 1)
+    promote_type: Union[type, None] = CODE_PROMOTIONS.get(code >> 12 & 7)
+    piece: Union[Piece, None] = board.get_piece(pos)
+    if isinstance(piece, King) and pos[0] == "e" and target[0] in "ah":
+        rook: Union[Piece, None] = board.get_piece(target)
+        if isinstance(rook, Rook) and rook.color == piece.color:
+            target = ("g" if target[0] == "h" else "c") + target[1]
+    return pos, target, promote_type
+
+
+def write_book(path: str, weights: dict[tuple[int, int], int]) -> int:
+    """Write {(key, move): weight} as a sorted book file, return the number of entries"""
+    scale: int = max(max(weights.values(), default=0) // 0xFFFF + 1, 1)
+    with open(path, "wb") as file:
+        for (key, move), weight in sorted(weights.items()):
+            file.write(ENTRY.pack(key, move, min(weight // scale, 0xFFFF), 0))
+    return len(weights)
+
+
+def build_book(paths: Iterable[str], output: str, plies: int = 20) -> int:
+    """
+    - Write a book of the first plies of the games of PGN files, return the number of entries
+    - A move scores 2 for each win of the side that played it and 1 for each draw
+    """
+    weights: dict[tuple[int, int], int] = {}
+    for path in paths:
+        for game in pgn.read_file(path):
+            try:
+                for ply, (_, board, move) in enumerate(pgn.replay(game)):
+                    if ply >= plies:
+                        break
+                    if game.result == "1/2-1/2":
+                        score = 1
+                    elif game.result == ("1-0" if board.turn == Color.WHITE else "0-1"):
+                        score = 2
+                    else:
+                        score = 0
+                    entry: tuple[int, int] = (board.hash, encode_move(board, move))
+                    weights[entry] = weights.get(entry, 0) + score
+            except pgn.IllegalMoveError:
+                continue  # Keep the moves before the illegal one
+    return write_book(output, weights)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or look into an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("paths", nargs="+", help="PGN files")
+    build.add_argument("--output", default=BOOK_PATH, help="defaults to book.bin")
+    build.add_argument(
+        "--plies", type=int, default=20, help="moves per game, defaults to 20"
+    )
+    probe = commands.add_parser("probe", help="show the book moves of a position")
+    probe.add_argument("book", help="the book file")
+    probe.add_argument("--fen", default=START_FEN, help="defaults to the start")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        entries: int = build_book(args.paths, args.output, args.plies)
+        print(f"{entries} entries written to {args.output}")
+        return
+    with OpeningBook(args.book) as book:
+        board = Board(args.fen)
+        for move, weight in sorted(book.get_moves(board), key=lambda item: -item[1]):
+            print(f"{get_move_name(*move)} {weight}")
+
+
+if __name__ == "__main__":
+    main()
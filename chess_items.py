@@ -1,35 +1,54 @@
-import pygame
-from pygame import Surface
+"""
+Images and sounds of the game.
+Each one is loaded the first time it is used, so importing this module needs no display or audio.
+"""
 import os
 
-pygame.mixer.init()
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Assets")
 
-# Chess board
-CHESS_BOARD_IMG: Surface = pygame.image.load(os.path.join("Assets", "chess-board.png"))
-CHESS_BOARD: Surface = pygame.transform.scale(CHESS_BOARD_IMG, (600, 600))
+# Name: (file name, size to scale to or None)
+ASSETS: dict[str, tuple] = {
+    # Chess board
+    "CHESS_BOARD_IMG": ("chess-board.png", None),
+    "CHESS_BOARD": ("chess-board.png", (600, 600)),
+    # Chess pieces
+    "WHITE_PAWN": ("white-pawn.png", None),
+    "WHITE_ROOK": ("white-rook.png", None),
+    "WHITE_KNIGHT": ("white-knight.png", None),
+    "WHITE_BISHOP": ("white-bishop.png", None),
+    "WHITE_QUEEN": ("white-queen.png", None),
+    "WHITE_KING": ("white-king.png", None),
+    "BLACK_PAWN": ("black-pawn.png", None),
+    "BLACK_ROOK": ("black-rook.png", None),
+    "BLACK_KNIGHT": ("black-knight.png", None),
+    "BLACK_BISHOP": ("black-bishop.png", None),
+    "BLACK_QUEEN": ("black-queen.png", None),
+    "BLACK_KING": ("black-king.png", None),
+    # Icons
+    "FLIP_ICON": ("flip-board.png", (28, 28)),
+    "ON_BUTTON": ("on-button.png", None),
+    "OFF_BUTTON": ("off-button.png", None),
+    "RESET_BUTTON": ("reset.png", None),
+    # Sounds
+    "MOVE_SOUND": ("move_sound.wav", None),
+}
 
-# Chess pieces
-WHITE_PAWN: Surface = pygame.image.load(os.path.join("Assets", "white-pawn.png"))
-WHITE_ROOK: Surface = pygame.image.load(os.path.join("Assets", "white-rook.png"))
-WHITE_KNIGHT: Surface = pygame.image.load(os.path.join("Assets", "white-knight.png"))
-WHITE_BISHOP: Surface = pygame.image.load(os.path.join("Assets", "white-bishop.png"))
-WHITE_QUEEN: Surface = pygame.image.load(os.path.join("Assets", "white-queen.png"))
-WHITE_KING: Surface = pygame.image.load(os.path.join("Assets", "white-king.png"))
 
-BLACK_PAWN: Surface = pygame.image.load(os.path.join("Assets", "black-pawn.png"))
-BLACK_ROOK: Surface = pygame.image.load(os.path.join("Assets", "black-rook.png"))
-BLACK_KNIGHT: Surface = pygame.image.load(os.path.join("Assets", "black-knight.png"))
-BLACK_BISHOP: Surface = pygame.image.load(os.path.join("Assets", "black-bishop.png"))
-BLACK_QUEEN: Surface = pygame.image.load(os.path.join("Assets", "black-queen.png"))
-BLACK_KING: Surface = pygame.image.load(os.path.join("Assets", "black-king.png"))
+def __getattr__(name: str):
+    """Load an asset on first access and keep it as a module attribute"""
+    if name not in ASSETS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import pygame
 
-# Icons
-FLIP_ICON: Surface = pygame.transform.scale(
-    pygame.image.load(os.path.join("Assets", "flip-board.png")), (28, 28)
-)
-ON_BUTTON: Surface = pygame.image.load(os.path.join("Assets", "on-button.png"))
-OFF_BUTTON: Surface = pygame.image.load(os.path.join("Assets", "off-button.png"))
-RESET_BUTTON: Surface = pygame.image.load(os.path.join("Assets", "reset.png"))
-
-# Sounds
-MOVE_SOUND = pygame.mixer.Sound(os.path.join("Assets", "move_sound.wav"))
+    file_name, size = ASSETS[name]
+    path = os.path.join(ASSETS_DIR, file_name)
+    if file_name.endswith(".wav"):
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        asset = pygame.mixer.Sound(path)
+    else:
+        asset = pygame.image.load(path)
+        if size is not None:
+            asset = pygame.transform.scale(asset, size)
+    globals()[name] = asset
+    return asset
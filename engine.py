@@ -0,0 +1,583 @@
+"""
+A computer player: iterative-deepening alpha-beta search over board.Board
+
+The search runs on a copy of the board, so Engine.start can run it on a background thread
+while the window keeps drawing and handling events. ParallelEngine spreads the root moves
+across worker processes. Positions covered by the endgame tablebases are not searched, their
+scores are read from the tables.
+
+Examples:
+    python engine.py --time 5
+    python engine.py --fen "<FEN>" --depth 4 --workers 8
+"""
+from board import *
+from book import OpeningBook
+from evaluation import PIECE_VALUES
+from tablebase import probe
+from transposition import TranspositionTable
+from typing import Callable, NamedTuple, Union
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+MAX_PLY = 128
+# Scores beyond this are mates, counted in plies from the root (tablebase ones can be longer)
+MATE_BOUND = MATE_SCORE - 2 * MAX_PLY
+CHECK_EVERY = 64  # Nodes between two looks at the clock
+QUIESCENCE_DEPTH = 6  # Captures searched in a row at most once the depth is used up
+DELTA_MARGIN = 200  # A capture that can't lift the score this close to alpha is skipped
+
+# Kinds of score stored in the transposition table
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# The engine only considers the promotions that can matter
+SEARCH_PROMOTIONS: tuple[type] = (Queen, Knight)
+
+
+class SearchResult(NamedTuple):
+    """The outcome of one search"""
+
+    move: Union[tuple, None]  # (pos, target, promote_type), None without legal moves
+    score: int  # Centipawns from the side to move's point of view
+    depth: int  # The deepest completed iteration
+    nodes: int
+    elapsed: float  # Seconds
+    hash: int  # Of the searched position, to tell a stale result from a current one
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / max(self.elapsed, 1e-9)
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time is up or the search was stopped"""
+
+
+class Engine:
+    """
+    - search finds the best move within a time budget, iteration by iteration
+    - start does the same on a background thread and hands the result to a callback
+    """
+
+    def __init__(
+        self,
+        time_limit: float = 2.0,
+        max_depth: int = 32,
+        table_size: int = 1 << 18,
+        book: Union[OpeningBook, None] = None,
+        tablebases: bool = True,
+    ):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.book = book  # Moves of the book are played without searching
+        self.tablebases = tablebases  # Look up endgames in the tables that were generated
+        self.table = TranspositionTable(table_size)
+        self.killers: list[list] = [[None, None] for _ in range(MAX_PLY)]
+        self.history: dict[tuple[str], int] = {}
+        # The (score, move) of the best root move searched so far in the current iteration
+        self.root_best: Union[tuple, None] = None
+        self.nodes = 0
+        self.deadline = 0.0
+        self.stop_event = threading.Event()
+        self.thread: Union[threading.Thread, None] = None
+
+    def start(
+        self, board: Board, callback: Callable[[SearchResult], None]
+    ) -> threading.Thread:
+        """Search the board on a background thread and call callback with the result"""
+        self.stop()
+        self.stop_event.clear()
+        board = board.copy()  # The caller keeps using its own board
+
+        def run() -> None:
+            result: SearchResult = self.search(board, copy_board=False)
+            if not self.stop_event.is_set():
+                callback(result)
+
+        self.thread = threading.Thread(target=run, name="engine", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        """Stop the background search, its result is dropped"""
+        if self.thread is not None and self.thread.is_alive():
+            self.stop_event.set()
+            self.thread.join()
+        self.thread = None
+
+    def is_thinking(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def search(
+        self,
+        board: Board,
+        time_limit: Union[float, None] = None,
+        max_depth: Union[int, None] = None,
+        copy_board: bool = True,
+    ) -> SearchResult:
+        """Search deeper and deeper until the time is up, return the last completed iteration"""
+        if self.book is not None:
+            book_move: Union[tuple, None] = self.book.choose_move(board)
+            if book_move is not None:
+                logger.info("book move %s", get_move_name(*book_move))
+                return SearchResult(book_move, 0, 0, 0, 0.0, board.hash)
+        if self.tablebases:
+            table_result: Union[SearchResult, None] = self.get_tablebase_move(board)
+            if table_result is not None:
+                logger.info("tablebase move %s", get_move_name(*table_result.move))
+                return table_result
+        if copy_board:
+            board = board.copy()  # An aborted search leaves its board half-moved
+        start = time.perf_counter()
+        self.deadline = start + (self.time_limit if time_limit is None else time_limit)
+        self.nodes = 0
+        self.clear_move_order()
+
+        moves: list[tuple] = board.get_moves(SEARCH_PROMOTIONS)
+        if not moves:
+            # Checkmated or stalemated, there is no move to return
+            score = -MATE_SCORE if board.can_be_checked(board.turn) else 0
+            return SearchResult(None, score, 0, 0, 0.0, board.hash)
+        self.order_moves(board, moves, 0, None)
+        result = SearchResult(moves[0], 0, 0, 0, 0.0, board.hash)
+        if len(moves) == 1:  # Nothing to think about
+            return result
+        for depth in range(1, (max_depth or self.max_depth) + 1):
+            self.root_best = None
+            try:
+                score, move = self.search_root(board, moves, depth)
+            except SearchAborted:
+                # Moves searched before the time ran out beat an unsearched guess
+                if result.depth == 0 and self.root_best is not None:
+                    score, move = self.root_best
+                    elapsed = time.perf_counter() - start
+                    result = SearchResult(move, score, 0, self.nodes, elapsed, board.hash)
+                break
+            elapsed = time.perf_counter() - start
+            result = SearchResult(move, score, depth, self.nodes, elapsed, board.hash)
+            logger.info(
+                "depth %d score %d nodes %d nps %.0f move %s",
+                depth,
+                score,
+                self.nodes,
+                result.nodes_per_second,
+                get_move_name(*move),
+            )
+            if abs(score) >= MATE_BOUND:  # A forced mate was found
+                break
+            # Search the best move first in the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+        return result._replace(nodes=self.nodes, elapsed=time.perf_counter() - start)
+
+    def search_root(self, board: Board, moves: list[tuple], depth: int) -> tuple:
+        """Return the (score, move) of the best move of the side to move"""
+        alpha, beta = -INFINITY, INFINITY
+        best_move: tuple = moves[0]
+        for move in moves:
+            undo: Undo = board.make_move(*move)
+            score = -self.alpha_beta(board, depth - 1, -beta, -alpha, 1)
+            board.unmake_move(undo)
+            if score > alpha:
+                alpha = score
+                best_move = move
+                self.root_best = (alpha, best_move)
+        self.table.store(board.hash, (depth, alpha, EXACT, best_move), depth)
+        return alpha, best_move
+
+    def alpha_beta(
+        self, board: Board, depth: int, alpha: int, beta: int, ply: int
+    ) -> int:
+        """Return the score of the board for the side to move, within alpha and beta"""
+        if self.tablebases:
+            value: Union[int, None] = probe(board)
+            if value is not None:
+                self.count_node()
+                return get_table_score(value, ply)
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(board, alpha, beta, ply, 0)
+        self.count_node()
+
+        entry: Union[tuple, None] = self.table.get(board.hash)
+        table_move: Union[tuple, None] = None
+        if entry is not None:
+            entry_depth, score, kind, table_move = entry
+            score = from_table_score(score, ply)
+            if entry_depth >= depth:
+                if kind == EXACT:
+                    return score
+                if kind == LOWER_BOUND and score >= beta:
+                    return score
+                if kind == UPPER_BOUND and score <= alpha:
+                    return score
+
+        moves: list[tuple] = board.get_moves(SEARCH_PROMOTIONS)
+        if not moves:
+            if board.can_be_checked(board.turn):
+                return -MATE_SCORE + ply  # Mated, prefer the slowest mate
+            return 0  # Stalemate
+        self.order_moves(board, moves, ply, table_move)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move: tuple = moves[0]
+        for move in moves:
+            capture: bool = self.is_capture(board, move)
+            undo: Undo = board.make_move(*move)
+            score = -self.alpha_beta(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move(undo)
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if (
+                    not capture
+                ):  # Quiet moves that refute a line are tried early elsewhere
+                    killers: list = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    key: tuple[str] = move[:2]
+                    self.history[key] = self.history.get(key, 0) + depth * depth
+                break
+
+        if best_score <= original_alpha:
+            kind = UPPER_BOUND
+        elif best_score >= beta:
+            kind = LOWER_BOUND
+        else:
+            kind = EXACT
+        entry = (depth, to_table_score(best_score, ply), kind, best_move)
+        self.table.store(board.hash, entry, depth)
+        return best_score
+
+    def get_tablebase_move(self, board: Board) -> Union[SearchResult, None]:
+        """Pick the move the tables rate best, None if the tables don't cover the board"""
+        if probe(board) is None:
+            return None
+        start = time.perf_counter()
+        best: Union[tuple, None] = None
+        best_score = -INFINITY
+        for move in board.get_moves(SEARCH_PROMOTIONS):
+            undo: Undo = board.make_move(*move)
+            value: Union[int, None] = probe(board)
+            board.unmake_move(undo)
+            # Off the tables a piece was taken or underpromoted, which leaves a draw
+            score: int = 0 if value is None else -get_table_score(value, 1)
+            if score > best_score:
+                best, best_score = move, score
+        if best is None:
+            return None
+        elapsed = time.perf_counter() - start
+        return SearchResult(best, best_score, 0, 0, elapsed, board.hash)
+
+    def quiescence(
+        self, board: Board, alpha: int, beta: int, ply: int, depth: int
+    ) -> int:
+        """
+        - Only search captures, so that the board is scored once it is quiet
+        - At most QUIESCENCE_DEPTH captures in a row, and none that can't reach alpha
+          (delta pruning)
+        """
+        self.count_node()
+        stand_pat: int = self.evaluate(board)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        if depth >= QUIESCENCE_DEPTH or ply >= MAX_PLY:
+            return alpha
+
+        color: Color = board.turn
+        captures: list[tuple] = self.get_captures(board)
+        captures.sort(key=lambda move: self.get_capture_score(board, move), reverse=True)
+        for move in captures:
+            if stand_pat + self.get_gain(board, move) + DELTA_MARGIN <= alpha:
+                continue
+            undo: Undo = board.make_move(*move)
+            if board.can_be_checked(color):  # The capture was not legal
+                board.unmake_move(undo)
+                continue
+            score = -self.quiescence(board, -beta, -alpha, ply + 1, depth + 1)
+            board.unmake_move(undo)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def count_node(self) -> None:
+        """Count a searched node and abort the search when the time is up"""
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            if self.stop_event.is_set() or time.perf_counter() > self.deadline:
+                raise SearchAborted()
+
+    def clear_move_order(self) -> None:
+        """Forget the killer moves and history of the last search"""
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history.clear()
+
+    def evaluate(self, board: Board) -> int:
+        """Score the board from the side to move's point of view, a read of the running score"""
+        score: int = board.get_score()
+        return score if board.turn == Color.WHITE else -score
+
+    def get_captures(self, board: Board) -> list[tuple]:
+        """Return the captures and queen promotions of the side to move, legal or not"""
+        captures: list[tuple] = []
+        for pos in board.get_piece_positions(board.turn):
+            piece: Piece = board.get_piece(pos)
+            for target in board.get_valid_moves(pos):
+                promote: bool = isinstance(piece, Pawn) and piece.can_promote(target)
+                move: tuple = (pos, target, Queen if promote else None)
+                if promote or self.is_capture(board, move):
+                    captures.append(move)
+        return captures
+
+    def is_capture(self, board: Board, move: tuple) -> bool:
+        pos, target, _ = move
+        if board.get_piece(target) is not None:
+            return True
+        # A pawn moving sideways to an empty square captures en passant
+        return isinstance(board.get_piece(pos), Pawn) and pos[0] != target[0]
+
+    def get_gain(self, board: Board, move: tuple) -> int:
+        """Return the material a capture or promotion wins at most"""
+        pos, target, promote_type = move
+        victim: Union[Piece, None] = board.get_piece(target)
+        gain: int = PIECE_VALUES[type(victim)] if victim is not None else 0
+        if victim is None and promote_type is None:  # En passant
+            gain = PIECE_VALUES[Pawn]
+        if promote_type is not None:
+            gain += PIECE_VALUES[promote_type] - PIECE_VALUES[Pawn]
+        return gain
+
+    def get_capture_score(self, board: Board, move: tuple) -> int:
+        """Most valuable victim first, then least valuable attacker (MVV-LVA)"""
+        pos, target, promote_type = move
+        victim: Union[Piece, None] = board.get_piece(target)
+        score = PIECE_VALUES[type(victim)] if victim is not None else PIECE_VALUES[Pawn]
+        if promote_type is not None:
+            score += PIECE_VALUES[promote_type]
+        return score * 10 - PIECE_VALUES[type(board.get_piece(pos))] // 100
+
+    def order_moves(
+        self, board: Board, moves: list[tuple], ply: int, table_move: Union[tuple, None]
+    ) -> None:
+        """Sort the moves so that the ones most likely to cause a cutoff come first"""
+        killers: list = self.killers[ply]
+
+        def get_order(move: tuple) -> int:
+            if move == table_move:
+                return 1 << 30
+            if move[2] is not None or self.is_capture(board, move):
+                return (1 << 20) + self.get_capture_score(board, move)
+            if move == killers[0]:
+                return (1 << 19) + 1
+            if move == killers[1]:
+                return 1 << 19
+            return min(self.history.get(move[:2], 0), (1 << 19) - 1)
+
+        moves.sort(key=get_order, reverse=True)
+
+
+def get_table_score(value: int, ply: int) -> int:
+    """Turn a tablebase value into a search score, mates that are further away score less"""
+    if value > 0:
+        return MATE_SCORE - ply - (value - 1)
+    if value < 0:
+        return -MATE_SCORE + ply + (-value - 1)
+    return 0
+
+
+def to_table_score(score: int, ply: int) -> int:
+    """Count a mate score from the node instead of the root, so it holds at any ply"""
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def from_table_score(score: int, ply: int) -> int:
+    """Count a mate score of the table from the root again, see to_table_score"""
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class ParallelEngine(Engine):
+    """
+    - Split the root moves of every iteration across a pool of worker processes
+    - The best move of the last iteration is searched first to set the bound for the others
+    - Positions go to the workers as Board.to_bytes, each worker keeps its own engine and table
+    """
+
+    def __init__(self, workers: Union[int, None] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.workers: int = workers or os.cpu_count() or 1
+        self.pool: Union[ProcessPoolExecutor, None] = None
+        self.searches = 0  # Tells the workers when a new search starts
+
+    def search(self, board: Board, *args, **kwargs) -> SearchResult:
+        self.searches += 1
+        return super().search(board, *args, **kwargs)
+
+    def get_pool(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use, they are kept between searches"""
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking a process that runs threads (the window, a search) can deadlock
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(len(self.table.entries), self.tablebases),
+            )
+        return self.pool
+
+    def close(self) -> None:
+        """Stop the worker processes"""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def search_root(self, board: Board, moves: list[tuple], depth: int) -> tuple:
+        """Return the (score, move) of the best move, searching the moves in parallel"""
+        position: bytes = board.to_bytes()
+        deadline: float = time.time() + self.deadline - time.perf_counter()
+        pool: ProcessPoolExecutor = self.get_pool()
+
+        def submit(move: tuple, alpha: int) -> Future:
+            return pool.submit(
+                search_root_move, position, move, depth, alpha, deadline, self.searches
+            )
+
+        first: Future = submit(moves[0], -INFINITY)
+        alpha: int = self.get_score(first, set())
+        best_move: tuple = moves[0]
+        self.root_best = (alpha, best_move)
+        # A move can only replace the best one by scoring above it, so each move is submitted
+        # once a worker is free, with the best score found by then
+        next_moves = iter(moves[1:])
+        futures: dict[Future, tuple] = {}
+        while True:
+            for move in itertools.islice(next_moves, self.workers - len(futures)):
+                futures[submit(move, alpha)] = move
+            if not futures:
+                break
+            done, _ = wait(futures, timeout=0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                move = futures.pop(future)
+                score: int = self.get_score(future, set(futures))
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self.root_best = (alpha, best_move)
+            if self.stop_event.is_set():
+                self.cancel(set(futures))
+                raise SearchAborted()
+        self.table.store(board.hash, (depth, alpha, EXACT, best_move), depth)
+        return alpha, best_move
+
+    def get_score(self, future: Future, pending: set[Future]) -> int:
+        """Return the score of a finished root move, aborting the iteration if it timed out"""
+        score, nodes = future.result()
+        self.nodes += nodes
+        if score is None:
+            self.cancel(pending)
+            raise SearchAborted()
+        return score
+
+    def cancel(self, futures: set[Future]) -> None:
+        """Drop the root moves that have not started, the running ones stop at the deadline"""
+        for future in futures:
+            future.cancel()
+
+
+# The engine of a worker process of ParallelEngine, and the search it last worked for
+worker_engine: Union[Engine, None] = None
+worker_search = 0
+
+
+def init_worker(table_size: int, tablebases: bool) -> None:
+    """Build the engine of a worker process with the settings of the parent engine"""
+    global worker_engine
+    worker_engine = Engine(table_size=table_size, tablebases=tablebases)
+
+
+def search_root_move(
+    position: bytes, move: tuple, depth: int, alpha: int, deadline: float, search: int
+) -> tuple:
+    """
+    - Search one root move in a worker process, with a window that only tells moves above alpha apart
+    - The killer moves and history are kept between the iterations of a search, like Engine.search
+    - Return (score, nodes), the score is None if the deadline (time.time) passed first
+    """
+    global worker_search
+    if time.time() >= deadline:  # Waited in the queue until the time was up
+        return None, 0
+    board: Board = Board.from_bytes(position)
+    engine: Engine = worker_engine
+    if search != worker_search:
+        engine.clear_move_order()
+        worker_search = search
+    engine.nodes = 0
+    engine.deadline = time.perf_counter() + deadline - time.time()
+    board.make_move(*move)
+    try:
+        score = -engine.alpha_beta(board, depth - 1, -INFINITY, -alpha, 1)
+    except SearchAborted:
+        return None, engine.nodes
+    return score, engine.nodes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Search a position and print each iteration"
+    )
+    parser.add_argument("--fen", help="the position to search, defaults to the start")
+    parser.add_argument(
+        "--time", type=float, default=10.0, help="seconds, defaults to 10"
+    )
+    parser.add_argument("--depth", type=int, default=32, help="stop after this depth")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="processes to search with, defaults to 1"
+    )
+    parser.add_argument("--book", help="an opening book to play from first")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    board: Board = Board.from_fen(args.fen) if args.fen else Board()
+    book: Union[OpeningBook, None] = OpeningBook(args.book) if args.book else None
+    if args.workers > 1:
+        engine: Engine = ParallelEngine(args.workers, time_limit=args.time, book=book)
+    else:
+        engine = Engine(time_limit=args.time, book=book)
+    result: SearchResult = engine.search(board, max_depth=args.depth)
+    if isinstance(engine, ParallelEngine):
+        engine.close()
+    if result.move is None:
+        print("no legal moves: " + ("checkmate" if result.score < 0 else "stalemate"))
+        return
+    print(
+        f"best {get_move_name(*result.move)} depth {result.depth} "
+        f"in {result.elapsed:.3f}s ({result.nodes_per_second:.0f} nodes/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Static evaluation of a Board: material plus piece-square tables
+
+The Board keeps running sums of these scores as pieces come and go (see Board.get_scores),
+so this module only needs the pieces and scoring a position is a read.
+"""
+from pieces import *
+from typing import NamedTuple
+
+PIECE_VALUES: dict[type, int] = {
+    Pawn: 100,
+    Knight: 320,
+    Bishop: 330,
+    Rook: 500,
+    Queen: 900,
+    King: 0,
+}
+
+# Bonus of a piece on each square index from white's point of view, a8 first.
+# Black pieces use the square mirrored vertically (index ^ 56).
+PIECE_SQUARE_TABLES: dict[type, list[int]] = {
+    Pawn: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    Knight: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    Bishop: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    Rook: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    Queen: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    King: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}  # fmt: skip
+
+
+# How much each piece counts towards the game phase, 24 with every piece on the board
+PHASE_WEIGHTS: dict[type, int] = {
+    Pawn: 0,
+    Knight: 1,
+    Bishop: 1,
+    Rook: 2,
+    Queen: 4,
+    King: 0,
+}
+MAX_PHASE = 24
+
+
+class Scores(NamedTuple):
+    """The running scores of a Board, in centipawns from each color's own point of view"""
+
+    material: dict[Color, int]
+    squares: dict[Color, int]  # Piece-square bonuses
+    phase: int  # MAX_PHASE in the opening, 0 with only kings and pawns, more after promotions
+
+    @property
+    def value(self) -> int:
+        """The score of the board, positive when white is better"""
+        return (
+            self.material[Color.WHITE]
+            - self.material[Color.BLACK]
+            + self.squares[Color.WHITE]
+            - self.squares[Color.BLACK]
+        )
+
+    @property
+    def taper(self) -> float:
+        """How far the game is from the endgame, 1.0 in the opening and 0.0 in the endgame"""
+        return min(self.phase, MAX_PHASE) / MAX_PHASE
+
+
+def get_piece_score(piece_type: type, color: Color, index: int) -> int:
+    """Return the value of a piece on the given square index from its own side's point of view"""
+    if color == Color.BLACK:
+        index ^= 56
+    return PIECE_VALUES[piece_type] + PIECE_SQUARE_TABLES[piece_type][index]
+
+
+# The piece-square bonus of each piece symbol on each square index, mirrored for black
+SQUARE_SCORES: dict[str, list[int]] = {
+    ("w" if color == Color.WHITE else "b")
+    + piece_type.letter: [
+        PIECE_SQUARE_TABLES[piece_type][index if color == Color.WHITE else index ^ 56]
+        for index in range(64)
+    ]
+    for piece_type in PIECE_SQUARE_TABLES
+    for color in (Color.WHITE, Color.BLACK)
+}
+
+
+def evaluate(board: "Board") -> int:
+    """Score the board in centipawns, positive when white is better"""
+    return board.get_score()
@@ -3,15 +3,25 @@ from board import *
 from typing import Union
 import time
 import pygame
+from pygame import Surface
 import chess_items as ci
-
-pygame.font.init()
-pygame.mixer.init()
+import sprites
+from engine import Engine, SearchResult
+from book import OpeningBook, open_book
+from speculation import Speculator
+from tablebase import get_mate_plies, probe
 
 # Screen
 WIDTH, HEIGHT = 800, 600
-SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Chess")
+PANEL_RECT = pygame.Rect(600, 0, 200, 600)
+ENGINE_EVENT = pygame.USEREVENT  # Posted by the engine thread when it has chosen a move
+# Plies each key moves through the history, Home and End go to its ends
+HISTORY_KEYS: dict[int, int] = {
+    pygame.K_LEFT: -1,
+    pygame.K_RIGHT: 1,
+    pygame.K_PAGEUP: -10,
+    pygame.K_PAGEDOWN: 10,
+}
 
 # Colors
 WHITE = (255, 255, 255)
@@ -21,13 +31,46 @@ LIGHT_GRAY = (173, 170, 166)
 YELLOW = (255, 255, 0)
 RED = (255, 0, 0)
 
-FONT = pygame.font.SysFont("comicsans", 30)
-MATE_FONT = pygame.font.SysFont("comicsans", 100)
-WINNER_FONT = pygame.font.SysFont("comicsans", 70)
-CHECK_TEXT = FONT.render("Check!", True, RED)
-CHECKMATE_TEXT = MATE_FONT.render("Checkmate!", True, RED)
-STALEMATE_TEXT = MATE_FONT.render("Stalemate!", True, RED)
-PROMOTION_TEXT = FONT.render("Promote your pawn", True, BLACK)
+# Set by init_screen, so that importing this module doesn't open a window
+SCREEN: Surface
+FONT: pygame.font.Font
+MATE_FONT: pygame.font.Font
+WINNER_FONT: pygame.font.Font
+CHECK_TEXT: Surface
+CHECKMATE_TEXT: Surface
+STALEMATE_TEXT: Surface
+PROMOTION_TEXT: Surface
+
+BOARD_BACKGROUND: Surface
+
+# What the screen shows, to only redraw what changes
+drawn_squares: dict[tuple[int], tuple] = {}
+drawn_panel: Union[tuple, None] = None
+
+# Surfaces that are drawn once and reused
+text_cache: dict[tuple, Surface] = {}
+panel_cache: dict[tuple, Surface] = {}
+
+
+def init_screen() -> None:
+    """Open the window and prepare the fonts and texts"""
+    global SCREEN, FONT, MATE_FONT, WINNER_FONT
+    global CHECK_TEXT, CHECKMATE_TEXT, STALEMATE_TEXT, PROMOTION_TEXT, BOARD_BACKGROUND
+    pygame.font.init()
+    pygame.mixer.init()
+    SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Chess")
+
+    FONT = pygame.font.SysFont("comicsans", 30)
+    MATE_FONT = pygame.font.SysFont("comicsans", 100)
+    WINNER_FONT = pygame.font.SysFont("comicsans", 70)
+    CHECK_TEXT = FONT.render("Check!", True, RED)
+    CHECKMATE_TEXT = MATE_FONT.render("Checkmate!", True, RED)
+    STALEMATE_TEXT = MATE_FONT.render("Stalemate!", True, RED)
+    PROMOTION_TEXT = FONT.render("Promote your pawn", True, BLACK)
+    BOARD_BACKGROUND = ci.CHESS_BOARD.convert()
+    text_cache.clear()
+    panel_cache.clear()
 
 
 def draw_screen(
@@ -38,46 +81,200 @@ def draw_screen(
     check: bool,
     is_flipped: bool,
     auto_flip: bool,
+    computer: Union[Color, None],
+    book_move: Union[str, None] = None,
+    ending: Union[str, None] = None,
 ) -> None:
-    SCREEN.fill(WHITE)
-    SCREEN.blit(ci.CHESS_BOARD, (0, 0))
+    """Redraw only the squares and panel that changed since the last call and update them"""
+    global drawn_squares, drawn_panel
+    dirty_rects: list[pygame.Rect] = []
+
+    squares = get_square_states(board, piece_moves if draw_moves else [], is_flipped)
+    for screen_square, state in squares.items():
+        if drawn_squares.get(screen_square) != state:
+            dirty_rects.append(draw_square(*screen_square, state))
+    drawn_squares = squares
+
+    panel: tuple = (current_player, check, auto_flip, computer, book_move, ending)
+    if panel != drawn_panel:
+        dirty_rects.append(draw_panel(*panel))
+        drawn_panel = panel
+
+    if dirty_rects:
+        pygame.display.update(dirty_rects)
+
+
+def invalidate_screen() -> None:
+    """Make the next draw_screen redraw everything, after something was drawn over the game"""
+    global drawn_squares, drawn_panel
+    drawn_squares = {}
+    drawn_panel = None
+
+
+def get_square_states(
+    board: Board, piece_moves: list[str], is_flipped: bool
+) -> dict[tuple[int], tuple]:
+    """Return what each square on the screen shows: (piece symbol, is clicked, has a move dot)"""
+    states: dict[tuple[int], tuple] = {}
+    for row in range(8):
+        for col in range(8):
+            piece: Union[Piece, None] = board.squares[row * 8 + col]
+            screen_square = get_row_col_with_flip(row, col, is_flipped)
+            if piece is None:
+                states[screen_square] = (None, False, False)
+            else:
+                is_clicked: bool = get_square_name(row, col) == board.selected
+                states[screen_square] = (piece.symbol, is_clicked, False)
+    for move in piece_moves:
+        screen_square = get_row_col_with_flip(*get_row_col(move), is_flipped)
+        symbol, is_clicked, _ = states[screen_square]
+        states[screen_square] = (symbol, is_clicked, True)
+    return states
+
+
+def draw_square(row: int, col: int, state: tuple) -> pygame.Rect:
+    """Draw one square of the screen and return its area"""
+    symbol, is_clicked, has_dot = state
+    rect = pygame.Rect(col * 75, row * 75, 75, 75)
+    SCREEN.blit(BOARD_BACKGROUND, rect, rect)
+    if is_clicked:
+        pygame.draw.rect(SCREEN, YELLOW, rect)
+    if symbol is not None:
+        SCREEN.blit(sprites.get_sprite(symbol), rect)
+    if has_dot:
+        pygame.draw.circle(SCREEN, DARK_BROWN, (col * 75 + 37, row * 75 + 37), 10)
+    return rect
+
+
+def draw_panel(
+    current_player: Color,
+    check: bool,
+    auto_flip: bool,
+    computer: Union[Color, None],
+    book_move: Union[str, None],
+    ending: Union[str, None],
+) -> pygame.Rect:
+    """
+    - Draw the side panel and return its area
+    - The panel without the book move and ending is cached, there are few of them
+    """
+    key: tuple = (current_player, check, auto_flip, computer)
+    panel: Union[Surface, None] = panel_cache.get(key)
+    if panel is None:
+        panel = build_panel(*key)
+        panel_cache[key] = panel
+    SCREEN.blit(panel, PANEL_RECT)
+    # These change with every position, so they are drawn each time and not cached
+    if book_move is not None:
+        text: Surface = FONT.render(f"Book: {book_move}", True, DARK_BROWN)
+        SCREEN.blit(text, (PANEL_RECT.x + 10, 250))
+    if ending is not None:
+        SCREEN.blit(FONT.render(ending, True, DARK_BROWN), (PANEL_RECT.x + 10, 200))
+    return PANEL_RECT
+
+
+def build_panel(
+    current_player: Color,
+    check: bool,
+    auto_flip: bool,
+    computer: Union[Color, None],
+) -> Surface:
+    """Compose the side panel for one state, coordinates are relative to the panel"""
+    panel = Surface(PANEL_RECT.size).convert()
+    panel.fill(WHITE)
+    pygame.draw.rect(panel, DARK_BROWN, (0, 380, 200, 220))
+    draw_current_player(panel, current_player)
+    panel.blit(CHECK_TEXT, (65, 520)) if check else None
+    draw_options(panel, auto_flip)
+    draw_computer(panel, computer)
+    draw_history(panel)
+    panel.blit(ci.RESET_BUTTON, (160, 560))
+    return panel
+
+
+def render_text(text: str, color: tuple[int]) -> Surface:
+    """Render the text with FONT once and reuse it"""
+    key: tuple = (text, color)
+    surface: Union[Surface, None] = text_cache.get(key)
+    if surface is None:
+        surface = FONT.render(text, True, color)
+        text_cache[key] = surface
+    return surface
+
+
+def wait_for_events() -> list[pygame.event.Event]:
+    """Sleep until there is an event, nothing on the screen moves by itself"""
+    return [pygame.event.wait()] + pygame.event.get()
+
+
+def draw_options(panel: Surface, auto_flip: bool) -> None:
+    panel.blit(render_text("Auto Flip", BLACK), (10, 386))
+    panel.blit(render_text("Flip", BLACK), (10, 420))
+    if auto_flip:
+        panel.blit(ci.ON_BUTTON, (160, 380))
+    else:
+        panel.blit(ci.OFF_BUTTON, (160, 380))
+    panel.blit(ci.FLIP_ICON, (160, 415))
 
-    pygame.draw.rect(SCREEN, DARK_BROWN, (600, 380, 200, 220))
-    draw_current_player(current_player)
-    SCREEN.blit(CHECK_TEXT, (665, 520)) if check else None
 
-    draw_pieces(board, is_flipped)
-    if draw_moves:
-        draw_available_moves(piece_moves, is_flipped)
+def draw_computer(panel: Surface, computer: Union[Color, None]) -> None:
+    """Show which side the computer plays, clicking it cycles through Off, Black and White"""
+    side: str = {None: "Off", Color.WHITE: "White", Color.BLACK: "Black"}[computer]
+    panel.blit(render_text("Computer", BLACK), (10, 300))
+    panel.blit(render_text(side, DARK_BROWN), (120, 300))
 
-    draw_options(auto_flip)
-    SCREEN.blit(ci.RESET_BUTTON, (760, 560))
-    pygame.display.update()
 
+def draw_history(panel: Surface) -> None:
+    """Undo and redo buttons, the arrow keys do the same"""
+    panel.blit(render_text("< Undo", BLACK), (10, 340))
+    panel.blit(render_text("Redo >", BLACK), (110, 340))
+
+
+def get_target_ply(
+    board: Board, key: int, computer: Union[Color, None]
+) -> Union[int, None]:
+    """Return the ply of the history a key goes to, None for other keys"""
+    if key == pygame.K_HOME:
+        return 0
+    if key == pygame.K_END:
+        return len(board.history)
+    step: Union[int, None] = HISTORY_KEYS.get(key)
+    if step is None:
+        return None
+    if computer is not None and abs(step) == 1:
+        step *= 2  # Back to the same side, or the computer would play again
+    return board.ply + step
 
-def draw_pieces(board: Board, is_flipped: bool) -> None:
-    """Draw the pieces on the board"""
-    squares = board.squares
-    for row in range(len(squares)):
-        for col in range(len(squares[row])):
-            piece: Union[Piece, None] = squares[row][col]
-            if piece is not None:
-                r, c = get_row_col_with_flip(row, col, is_flipped)
-                if piece.is_clicked:
-                    pygame.draw.rect(SCREEN, YELLOW, (c * 75, r * 75, 75, 75))
-                SCREEN.blit(piece.img, (c * 75, r * 75))
-
-
-def draw_options(auto_flip: bool) -> None:
-    auto_flip_text = FONT.render("Auto Flip", True, BLACK)
-    flip_text = FONT.render("Flip", True, BLACK)
-    SCREEN.blit(auto_flip_text, (610, 386))
-    SCREEN.blit(flip_text, (610, 420))
-    if auto_flip:
-        SCREEN.blit(ci.ON_BUTTON, (760, 380))
-    else:
-        SCREEN.blit(ci.OFF_BUTTON, (760, 380))
-    SCREEN.blit(ci.FLIP_ICON, (760, 415))
+
+def get_next_computer(computer: Union[Color, None]) -> Union[Color, None]:
+    """The side the computer plays after clicking its option"""
+    return {None: Color.BLACK, Color.BLACK: Color.WHITE, Color.WHITE: None}[computer]
+
+
+def get_book_move(book: Union[OpeningBook, None], board: Board) -> Union[str, None]:
+    """Name the best move of the book for the board, None without a book or out of book"""
+    if book is None:
+        return None
+    move: Union[tuple, None] = book.get_best_move(board)
+    return None if move is None else get_move_name(*move)
+
+
+def get_ending(board: Board) -> Union[str, None]:
+    """Say how the endgame ends according to the tablebases, None if they don't cover it"""
+    value: Union[int, None] = probe(board)
+    if value is None:
+        return None
+    if value == 0:
+        return "Draw"
+    winner: Color = board.turn if value > 0 else get_opposite_color(board.turn)
+    name: str = "White" if winner == Color.WHITE else "Black"
+    moves: int = (get_mate_plies(value) + 1) // 2
+    return f"{name} mates in {moves}"
+
+
+def post_engine_result(result: SearchResult) -> None:
+    """Hand the engine's move to the event loop, called on the engine thread"""
+    pygame.event.post(pygame.event.Event(ENGINE_EVENT, result=result))
 
 
 def draw_winner(current_player: Color, is_checkmate: bool) -> None:
@@ -91,21 +288,11 @@ def draw_winner(current_player: Color, is_checkmate: bool) -> None:
     pygame.display.update()
 
 
-def draw_available_moves(piece_moves: list[str], is_flipped: bool) -> None:
-    """Draw the available moves on the board"""
-    for move in piece_moves:
-        row, col = get_row_col(move)
-        row, col = get_row_col_with_flip(row, col, is_flipped)
-        pygame.draw.circle(SCREEN, DARK_BROWN, (col * 75 + 37, row * 75 + 37), 10)
-
-
-def draw_current_player(current_player: Color) -> None:
-    current_text = FONT.render("Current Player", True, BLACK)
+def draw_current_player(panel: Surface, current_player: Color) -> None:
     player: str = "White" if current_player == Color.WHITE else "Black"
     color_of_player = WHITE if current_player == Color.WHITE else BLACK
-    current_player_text = FONT.render(player, True, color_of_player)
-    SCREEN.blit(current_text, (630, 460))
-    SCREEN.blit(current_player_text, (670, 490))
+    panel.blit(render_text("Current Player", BLACK), (30, 460))
+    panel.blit(render_text(player, color_of_player), (70, 490))
 
 
 def draw_promote_options() -> None:
@@ -128,87 +315,67 @@ def get_row_col_with_flip(row: int, col: int, is_flipped: bool) -> tuple[int]:
 
 def validate_chosen_piece(current_player: Color, board: Board, index: tuple[int]) -> bool:
     """Validating the chosen square"""
-    piece: Union[Piece, None] = board.squares[index[0]][index[1]]
+    piece: Union[Piece, None] = board.squares[index[0] * 8 + index[1]]
 
     if piece is None:
         return False
     elif piece.color != current_player:
         return False
-    else:
-        piece_moves: list[str] = board.get_valid_moves(piece.pos)
-        actual_piece_moves: list[str] = board.moves_to_not_in_check(piece, piece_moves)
-        if len(actual_piece_moves) == 0:
-            return False
+    elif not board.get_turn_moves().get(get_square_name(index[0], index[1])):
+        return False
     return True
 
 
-def get_piece_moves(board: Board, piece: Piece) -> list[str]:
-    """Get the valid moves of the piece"""
-    piece_moves: list[str] = board.get_valid_moves(piece.pos)
-    actual_piece_moves: list[str] = board.moves_to_not_in_check(piece, piece_moves)
-    return actual_piece_moves
+def get_piece_moves(board: Board, pos: str) -> list[str]:
+    """Get the legal moves of the piece at pos"""
+    return board.get_turn_moves().get(pos, [])
 
 
-def validate_target_piece(
-    board: Board, piece: Piece, piece_moves: list[str], index: tuple[int]
-) -> bool:
-    """Validating the target square"""
+def validate_target_piece(board: Board, chosen_square: str, index: tuple[int]) -> bool:
+    """Validating the target square, the moves of the turn are already legal"""
     target_square: str = get_square_name(index[0], index[1])
-    if target_square == piece.pos:
-        return False
-    if target_square not in piece_moves:
-        return False
-    if board.get_checked_when_move(piece, target_square):
-        return False
-    return True
+    return target_square in board.get_turn_moves().get(chosen_square, [])
 
 
 def promotion() -> Union[type, None]:
     draw_promote_options()
+    invalidate_screen()
     while True:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                pos = pygame.mouse.get_pos()
-                if 630 <= pos[0] <= 690:
-                    if 50 <= pos[1] <= 100:
-                        return Queen
-                    elif 100 <= pos[1] <= 150:
-                        return Knight
-                elif 720 <= pos[0] <= 780:
-                    if 50 <= pos[1] <= 100:
-                        return Rook
-                    elif 100 <= pos[1] <= 150:
-                        return Bishop
-
-
-def move(board: Board, piece: Piece, chosen_square: str, target_square: str) -> None:
-    """Move the piece on the board"""
-    is_a_pawn: bool = isinstance(piece, Pawn)
-    is_a_king: bool = isinstance(piece, King)
-    promote_type = None
-    if is_a_pawn:  # Check for promotion
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            pygame.quit()
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            pos = pygame.mouse.get_pos()
+            if 630 <= pos[0] <= 690:
+                if 50 <= pos[1] <= 100:
+                    return Queen
+                elif 100 <= pos[1] <= 150:
+                    return Knight
+            elif 720 <= pos[0] <= 780:
+                if 50 <= pos[1] <= 100:
+                    return Rook
+                elif 100 <= pos[1] <= 150:
+                    return Bishop
+
+
+def move(
+    board: Board,
+    chosen_square: str,
+    target_square: str,
+    promote_type: Union[type, None] = None,
+) -> None:
+    """Move the piece on the board, asking what to promote to unless promote_type is given"""
+    piece: Piece = board.get_piece(chosen_square)
+    if promote_type is None and isinstance(piece, Pawn):  # Check for promotion
         if piece.can_promote(target_square):
             promote_type = promotion()
-    if is_a_king:
-        do_castle: bool = piece.castle(target_square)
-    board.update(
-        chosen_square,
-        target_square,
-        is_pawn=is_a_pawn,
-        do_castle=(is_a_king and do_castle),
-    )
-    piece.pos = target_square
-    if promote_type is not None:
-        promote_piece_row, promote_piece_col = get_row_col(target_square)
-        board.squares[promote_piece_row][promote_piece_col] = promote_type(
-            target_square, piece.color
-        )
+    board.update(chosen_square, target_square, promote_type)
     ci.MOVE_SOUND.play()
 
 
 def main():
+    init_screen()
+
     # Initialize variables
     board: Board = Board()
     auto_flip: bool = False
@@ -220,17 +387,77 @@ def main():
     is_mate: bool = False
     is_checkmate: bool = False
     piece_moves: list[str] = []
+    promote_type: Union[type, None] = None
+    book: Union[OpeningBook, None] = open_book()
+    engine = Engine(book=book)
+    computer: Union[Color, None] = None  # The side the engine plays
+    is_thinking: bool = False
+    speculator = Speculator()  # Works out the replies while the player thinks
+    speculated: Union[int, None] = None  # The hash of the last position it started on
 
     # Initialize the GUI
     running = True
     while running:
         if auto_flip:
             is_flipped: bool = current_player == Color.BLACK
-        for event in pygame.event.get():
+        draw_screen(
+            board,
+            current_player,
+            piece_moves,
+            is_choosing_target,
+            check,
+            is_flipped,
+            auto_flip,
+            computer,
+            get_book_move(book, board),
+            get_ending(board),
+        )
+        if is_mate:
+            draw_winner(current_player, is_checkmate)
+            time.sleep(5)
+            break
+        if current_player == computer and not is_thinking:
+            engine.start(board, post_engine_result)
+            is_thinking = True
+        if current_player != computer and speculated != board.hash:
+            speculator.start(board)
+            speculated = board.hash
+
+        for event in wait_for_events():
             if event.type == pygame.QUIT:
                 running = False
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                invalidate_screen()
+            if event.type == ENGINE_EVENT:
+                is_thinking = False
+                result: SearchResult = event.result
+                # Drop a result that was searched for another position or side, or has no move
+                if (
+                    result.hash == board.hash
+                    and current_player == computer
+                    and result.move is not None
+                ):
+                    chosen, target, promote_type = result.move
+                    can_move_piece = True
+                    current_player = get_opposite_color(current_player)
+                    pygame.display.set_caption(
+                        f"Chess - depth {result.depth}, "
+                        f"{result.nodes_per_second:.0f} nodes/s"
+                    )
+            target_ply: Union[int, None] = None
+            if event.type == pygame.KEYDOWN:
+                target_ply = get_target_ply(board, event.key, computer)
             if event.type == pygame.MOUSEBUTTONDOWN:
                 row, col = pygame.mouse.get_pos()
+                if 600 <= row < 700 and 340 <= col <= 375:
+                    target_ply = get_target_ply(board, pygame.K_LEFT, computer)
+                if 700 <= row and 340 <= col <= 375:
+                    target_ply = get_target_ply(board, pygame.K_RIGHT, computer)
+                if 600 <= row and 300 <= col <= 335:
+                    computer = get_next_computer(computer)
+                    if is_choosing_target:  # Drop the selection of a human move
+                        is_choosing_target = False
+                        board.selected = None
                 if 760 <= row <= 790 and 385 <= col <= 405:
                     auto_flip = not auto_flip
                 if 760 <= row <= 790 and 420 <= col <= 440:
@@ -239,71 +466,57 @@ def main():
                 if 760 <= row and 560 <= col:
                     board = Board()
                     current_player = Color.WHITE
+                    engine.stop()
+                    is_thinking = False
                 row = row // 75
                 col = col // 75
                 row, col = get_row_col_with_flip(row, col, is_flipped)
-                if 0 <= row < 8 and 0 <= col < 8:
+                if 0 <= row < 8 and 0 <= col < 8 and current_player != computer:
                     if not is_choosing_target:
                         if validate_chosen_piece(current_player, board, (col, row)):
-                            piece: Piece = board.squares[col][row]
-                            piece.is_clicked = True
-                            piece_moves: list[str] = get_piece_moves(
-                                board, board.squares[col][row]
-                            )
+                            chosen: str = get_square_name(col, row)
+                            board.selected = chosen
+                            piece_moves: list[str] = get_piece_moves(board, chosen)
                             is_choosing_target = True
                     else:
                         is_choosing_target = False
-                        if validate_target_piece(board, piece, piece_moves, (col, row)):
+                        if validate_target_piece(board, chosen, (col, row)):
                             can_move_piece = True
                             target: str = get_square_name(col, row)
+                            promote_type = None
                             current_player = (
                                 Color.BLACK
                                 if current_player == Color.WHITE
                                 else Color.WHITE
                             )
                         else:
-                            piece.is_clicked = False
-        if can_move_piece:
-            king_pos: str = board.get_king_pos(get_opposite_color(piece.color))
-            king: King = board.get_piece(king_pos)
-            move(board, piece, piece.pos, target)
-            # If check
-            if board.can_check(board.get_piece(target)):
-                king.in_check = True
-                check = True
-                moves_to_cover_check: list = board.move_to_avoid_mate(
-                    get_opposite_color(piece.color)
+                            board.selected = None
+            if target_ply is not None:  # Go back or forward in the game
+                engine.stop()
+                is_thinking = False
+                speculator.stop()
+                board.seek(target_ply)
+                board.selected = None
+                is_choosing_target = False
+                current_player = board.turn
+                check = speculator.get_status(board).in_check
+                pygame.display.set_caption(
+                    f"Chess - ply {board.ply} of {len(board.history)}"
                 )
-                king_moves_to_live: list = board.get_valid_moves(king_pos)
-                # If there are moves to cover check
-                if moves_to_cover_check:
-                    # Extend with the king's moves
-                    moves_to_cover_check.extend(king_moves_to_live)
-                else:  # If there are no moves to cover check
-                    if not king_moves_to_live:
-                        is_mate = True
-                        is_checkmate = True
-            else:  #  If not check
-                king.in_check = False
-                check = False
-                if board.stalemate(get_opposite_color(piece.color)):
-                    is_mate = True
+        if can_move_piece:
+            board.selected = None
+            speculator.stop()
+            move(board, chosen, target, promote_type)
+            # Of the side that moves next, usually worked out while the player was thinking
+            status: GameStatus = speculator.get_status(board)
+            check = status.in_check
+            if status.is_over:
+                is_mate = True
+                is_checkmate = status.checkmate
             can_move_piece = False
-            piece.is_clicked = False
 
-        draw_screen(
-            board,
-            current_player,
-            piece_moves,
-            is_choosing_target,
-            check,
-            is_flipped,
-            auto_flip,
-        )
-        if is_mate:
-            draw_winner(current_player, is_checkmate)
-            time.sleep(5)
-            running = False
+    engine.stop()
+    speculator.stop()
     pygame.quit()
 
 
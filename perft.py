@@ -0,0 +1,205 @@
+"""
+Count the leaves of the legal move tree to check and time the move generator of board.Board
+
+Examples:
+    python perft.py --depth 3
+    python perft.py --position kiwipete --depth 2 --divide
+    python perft.py --fen "8/8/8/8/8/8/8/K1k5 w - - 0 1" --depth 4
+    python perft.py --suite
+    python perft.py --suite --bitboard
+"""
+from board import *
+from bitboard import Position
+import argparse
+import time
+
+# name: (FEN, {depth: number of leaves})
+POSITIONS: dict[str, tuple] = {
+    "startpos": (START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    "kiwipete": (
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        {1: 48, 2: 2039, 3: 97862},
+    ),
+    "position3": (
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        {1: 14, 2: 191, 3: 2812, 4: 43238},
+    ),
+    "position4": (
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        {1: 6, 2: 264, 3: 9467},
+    ),
+    "position5": (
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        {1: 44, 2: 1486, 3: 62379},
+    ),
+    "position6": (
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        {1: 46, 2: 2079, 3: 89890},
+    ),
+    # En passant, castling and promotion edge cases
+    "illegal-ep-1": (
+        "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+        {1: 18, 2: 92, 3: 1670, 6: 1134888},
+    ),
+    "illegal-ep-2": (
+        "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+        {1: 13, 2: 102, 3: 1266, 6: 1015133},
+    ),
+    "ep-gives-check": (
+        "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+        {1: 15, 2: 126, 3: 1928, 6: 1440467},
+    ),
+    "short-castle-check": (
+        "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+        {1: 15, 2: 66, 3: 1198, 6: 661072},
+    ),
+    "long-castle-check": (
+        "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+        {1: 16, 2: 71, 3: 1286, 6: 803711},
+    ),
+    "castle-rights": (
+        "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+        {1: 26, 2: 1141, 3: 27826, 4: 1274206},
+    ),
+    "castle-prevented": (
+        "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+        {1: 44, 2: 1494, 3: 50509, 4: 1720476},
+    ),
+    "promote-out-of-check": (
+        "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+        {1: 11, 2: 133, 3: 1442, 6: 3821001},
+    ),
+    "discovered-check": (
+        "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+        {1: 29, 2: 165, 3: 5160, 5: 1004658},
+    ),
+    "promote-to-check": (
+        "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+        {1: 9, 2: 40, 3: 472, 6: 217342},
+    ),
+    "underpromote-to-check": (
+        "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+        {1: 6, 2: 27, 3: 273, 6: 92683},
+    ),
+    "self-stalemate": ("K1k5/8/P7/8/8/8/8/8 w - - 0 1", {1: 2, 2: 6, 3: 13, 6: 2217}),
+    "stalemate-checkmate-1": (
+        "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+        {1: 10, 2: 25, 3: 268, 7: 567584},
+    ),
+    "stalemate-checkmate-2": (
+        "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+        {1: 37, 2: 183, 3: 6559, 4: 23527},
+    ),
+}
+
+
+def perft(board: Board, depth: int) -> int:
+    """Return the number of leaves of the legal move tree of the given depth"""
+    if depth == 0:
+        return 1
+    moves: list[tuple] = board.get_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo: Undo = board.make_move(*move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(undo)
+    return nodes
+
+
+def divide(board: Board, depth: int) -> dict[str, int]:
+    """Return the number of leaves under each move of the side to move"""
+    results: dict[str, int] = {}
+    for move in board.get_moves():
+        undo: Undo = board.make_move(*move)
+        results[get_move_name(*move)] = perft(board, depth - 1)
+        board.unmake_move(undo)
+    return results
+
+
+def run(fen: str, depth: int, show_divide: bool = False, bitboard: bool = False) -> int:
+    """
+    - Print the perft result of the position and return the number of leaves
+    - With bitboard, count again with bitboard.Position and print whether they agree
+    """
+    board: Board = Board.from_fen(fen)
+    start = time.perf_counter()
+    if show_divide:
+        results = divide(board, depth)
+        for name in sorted(results):
+            print(f"{name}: {results[name]}")
+        nodes = sum(results.values())
+    else:
+        nodes = perft(board, depth)
+    elapsed = time.perf_counter() - start
+    print(
+        f"depth {depth}: {nodes} nodes in {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):.0f} nodes/s)"
+    )
+    if bitboard:
+        bitboard_nodes: int = Position.from_board(board).perft(depth)
+        status = "agrees" if bitboard_nodes == nodes else "DIFFERS"
+        print(f"bitboard: {bitboard_nodes} nodes, {status}")
+    return nodes
+
+
+def run_suite(max_depth: int, bitboard: bool = False) -> bool:
+    """
+    - Check every reference position up to max_depth, return True if all counts match
+    - With bitboard, bitboard.Position has to find the same counts
+    """
+    all_passed = True
+    total_nodes = 0
+    start = time.perf_counter()
+    for name, (fen, counts) in POSITIONS.items():
+        for depth, expected in sorted(counts.items()):
+            if depth > max_depth:
+                continue
+            board: Board = Board.from_fen(fen)
+            nodes = perft(board, depth)
+            total_nodes += nodes
+            status = "ok" if nodes == expected else f"FAILED (expected {expected})"
+            all_passed = all_passed and nodes == expected
+            if bitboard:
+                bitboard_nodes: int = Position.from_board(board).perft(depth)
+                if bitboard_nodes != expected:
+                    status += f", bitboard FAILED ({bitboard_nodes})"
+                    all_passed = False
+            print(f"{name} depth {depth}: {nodes} {status}")
+    elapsed = time.perf_counter() - start
+    print(
+        f"{total_nodes} nodes in {elapsed:.3f}s ({total_nodes / max(elapsed, 1e-9):.0f} nodes/s)"
+    )
+    return all_passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Perft for board.Board")
+    parser.add_argument("--fen", help="the position to count from")
+    parser.add_argument(
+        "--position", choices=sorted(POSITIONS), help="a reference position"
+    )
+    parser.add_argument("--depth", type=int, help="defaults to 3")
+    parser.add_argument(
+        "--divide", action="store_true", help="show the count under each move"
+    )
+    parser.add_argument(
+        "--suite", action="store_true", help="check every reference position"
+    )
+    parser.add_argument(
+        "--bitboard",
+        action="store_true",
+        help="count again with bitboard.Position to cross-check both generators",
+    )
+    args = parser.parse_args()
+
+    if args.suite:
+        raise SystemExit(0 if run_suite(args.depth or 3, args.bitboard) else 1)
+    fen = args.fen
+    if fen is None:
+        fen = POSITIONS[args.position or "startpos"][0]
+    run(fen, args.depth or 3, args.divide, args.bitboard)
+
+
+if __name__ == "__main__":
+    main()
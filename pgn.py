@@ -0,0 +1,213 @@
+"""
+Read PGN game archives and replay them on board.Board
+
+Files are read line by line, so memory stays the same whatever their size.
+
+Examples:
+    python pgn.py games.pgn
+    python pgn.py archive/*.pgn --workers 8
+"""
+from board import *
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, NamedTuple
+import argparse
+import os
+import re
+import time
+
+RESULTS: tuple[str] = ("1-0", "0-1", "1/2-1/2", "*")
+HEADER_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_RE = re.compile(r"[{}();]|[^\s{}();]+")
+MOVE_NUMBER_RE = re.compile(r"^\d+\.*")
+SAN_RE = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$")
+EN_PASSANT_SUFFIX = "e.p."  # Some files write en passant captures as exd6 e.p.
+CASTLING_SAN: dict[str, str] = {"O-O": "g", "O-O-O": "c", "0-0": "g", "0-0-0": "c"}
+
+
+class Game(NamedTuple):
+    """One game of a PGN file, its moves are still SAN text"""
+
+    headers: dict[str, str]
+    moves: list[str]
+    result: str
+
+
+class IllegalMoveError(ValueError):
+    """A SAN move that can't be read or isn't legal on the board"""
+
+
+class FileReport(NamedTuple):
+    """What check_file found in one file"""
+
+    path: str
+    games: int
+    positions: int
+    errors: list[str]
+
+
+def read_games(lines: Iterable[str]) -> Iterator[Game]:
+    """Split PGN text into games, skipping comments, variations and annotations"""
+    headers: dict[str, str] = {}
+    moves: list[str] = []
+    in_comment = False
+    variation_depth = 0
+    for line in lines:
+        if not in_comment and not variation_depth:
+            stripped = line.strip()
+            if stripped.startswith("["):
+                if moves:  # A game without a result ends at the next headers
+                    yield Game(headers, moves, headers.get("Result", "*"))
+                    headers, moves = {}, []
+                match = HEADER_RE.match(stripped)
+                if match is not None:
+                    headers[match.group(1)] = match.group(2).replace('\\"', '"')
+                continue
+            if stripped.startswith("%"):  # Escaped line
+                continue
+        for token in TOKEN_RE.findall(line):
+            if in_comment:
+                in_comment = token != "}"
+            elif token == "{":
+                in_comment = True
+            elif token == ";":  # The rest of the line is a comment
+                break
+            elif token == "(":
+                variation_depth += 1
+            elif token == ")":
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth or token.startswith("$") or token == EN_PASSANT_SUFFIX:
+                continue
+            elif token in RESULTS:
+                yield Game(headers, moves, token)
+                headers, moves = {}, []
+            else:
+                move: str = MOVE_NUMBER_RE.sub("", token)
+                if move:
+                    moves.append(move)
+    if moves or headers:
+        yield Game(headers, moves, headers.get("Result", "*"))
+
+
+def read_file(path: str) -> Iterator[Game]:
+    """Read the games of a PGN file one at a time"""
+    with open(path, encoding="utf-8", errors="replace") as file:
+        yield from read_games(file)
+
+
+def parse_san(board: Board, san: str) -> tuple:
+    """Return the legal (pos, target, promote_type) move the SAN text names on the board"""
+    text: str = san.rstrip("+#!?").removesuffix(EN_PASSANT_SUFFIX).rstrip()
+    color: Color = board.turn
+    if text in CASTLING_SAN:
+        king_pos: Union[str, None] = board.get_king_pos(color)
+        if king_pos is not None:
+            target: str = CASTLING_SAN[text] + king_pos[1]
+            if king_pos[0] == "e" and target in board.get_legal_moves(king_pos):
+                return king_pos, target, None
+        raise IllegalMoveError(f"{san} is not legal")
+
+    match = SAN_RE.match(text)
+    if match is None:
+        raise IllegalMoveError(f"can't read {san}")
+    letter, from_file, from_rank, capture, target, promotion = match.groups()
+    piece_type: type = FEN_PIECES[letter.lower()] if letter else Pawn
+    candidates: list[str] = [
+        pos
+        for pos in board.get_piece_positions(color, piece_type)
+        if (from_file is None or pos[0] == from_file)
+        and (from_rank is None or pos[1] == from_rank)
+        # A pawn changes file only to capture, and a pawn capture is written with an x
+        and (piece_type is not Pawn or (pos[0] != target[0]) == bool(capture))
+        and board.get_piece(pos).can_move(pos, target)  # Cheap shape test first
+        and target in board.get_legal_moves(pos)
+    ]
+    if not candidates:
+        raise IllegalMoveError(f"{san} is not legal")
+    if len(candidates) > 1:
+        raise IllegalMoveError(f"{san} is ambiguous")
+    pos: str = candidates[0]
+
+    promote_type: Union[type, None] = FEN_PIECES[promotion.lower()] if promotion else None
+    promotes: bool = piece_type is Pawn and board.get_piece(pos).can_promote(target)
+    if promotes and promote_type is None:
+        raise IllegalMoveError(f"{san} doesn't say what to promote to")
+    if promote_type is not None and not promotes:
+        raise IllegalMoveError(f"{san} can't promote")
+    return pos, target, promote_type
+
+
+def replay(game: Game) -> Iterator[tuple[dict[str, str], Board, tuple]]:
+    """
+    - Play the game on a Board, yielding (headers, board, move) before each move
+    - The board is the one being played on, use copy() or to_bytes() to keep a position
+    - Raise IllegalMoveError at the first move that isn't legal
+    """
+    board = Board(game.headers.get("FEN", START_FEN))
+    for ply, san in enumerate(game.moves, start=1):
+        try:
+            move: tuple = parse_san(board, san)
+        except IllegalMoveError as error:
+            raise IllegalMoveError(f"ply {ply}: {error}") from None
+        yield game.headers, board, move
+        board.make_move(*move)
+
+
+def replay_file(path: str) -> Iterator[tuple[dict[str, str], Board, tuple]]:
+    """Replay every game of a PGN file, see replay"""
+    for game in read_file(path):
+        yield from replay(game)
+
+
+def check_file(path: str) -> FileReport:
+    """Replay every game of the file and collect the illegal moves instead of stopping"""
+    games = positions = 0
+    errors: list[str] = []
+    for games, game in enumerate(read_file(path), start=1):
+        try:
+            for _ in replay(game):
+                positions += 1
+        except IllegalMoveError as error:
+            players = (
+                f"{game.headers.get('White', '?')} - {game.headers.get('Black', '?')}"
+            )
+            errors.append(f"{path}: game {games} ({players}), {error}")
+    return FileReport(path, games, positions, errors)
+
+
+def check_files(paths: list[str], workers: Union[int, None] = None) -> list[FileReport]:
+    """Check the files in a pool of worker processes, one file per task"""
+    if workers == 1 or len(paths) == 1:
+        return [check_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(check_file, paths))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check PGN files against board.Board")
+    parser.add_argument("paths", nargs="+", help="PGN files")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="processes, one per CPU by default",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports: list[FileReport] = check_files(args.paths, args.workers)
+    elapsed = time.perf_counter() - start
+    for report in reports:
+        for error in report.errors:
+            print(error)
+    games: int = sum(report.games for report in reports)
+    positions: int = sum(report.positions for report in reports)
+    errors: int = sum(len(report.errors) for report in reports)
+    print(
+        f"{games} games, {positions} positions, {errors} with illegal moves "
+        f"in {elapsed:.3f}s ({games / max(elapsed, 1e-9):.1f} games/s)"
+    )
+    raise SystemExit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
-"""Make chess pieces"""
+"""
+Make chess pieces
+
+Pieces are immutable and shared: there is one instance per type and color, given by
+get_shared_piece. Where a piece stands, castling rights, en passant and the selection are
+kept by the Board.
+"""
 from abc import ABC, abstractmethod
 from enum import Enum, auto
-import chess_items as ci
-import pygame
 
 
 class Color(Enum):
@@ -13,18 +17,39 @@ class Color(Enum):
 
 
 class Piece(ABC):
-    symbol: str = "?"
-    is_clicked = False
-
     """Abstract class for chess pieces"""
 
-    def __init__(self, pos: str, color: Color) -> None:
-        self.pos: str = pos
-        self.color: Color = color
+    __slots__ = ("color", "symbol")
+    letter: str = "?"  # Upper case FEN letter, the symbol is the color's letter and this
+
+    def __init__(self, color: Color) -> None:
+        object.__setattr__(self, "color", color)
+        object.__setattr__(
+            self, "symbol", ("w" if color == Color.WHITE else "b") + self.letter
+        )
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is shared and can't be changed")
 
     def __repr__(self) -> str:
         return f"Piece: {self.symbol} {self.color}"
 
+    def __reduce__(self) -> tuple:
+        return get_shared_piece, (type(self), self.color)  # Stay shared across processes
+
+    def __copy__(self) -> "Piece":
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "Piece":
+        return self
+
+    @property
+    def img(self):
+        """The shared image of this kind of piece, loaded on first use so the rules need no pygame"""
+        import sprites
+
+        return sprites.get_sprite(self.symbol)
+
     def square_in_board(self, target: str) -> bool:
         """Check if the target square is on the board or not"""
         letter, number = target[0], target[1]
@@ -34,26 +59,20 @@ class Piece(ABC):
         return False
 
     @abstractmethod
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
 
 
 class Rook(Piece):
     """Rook class"""
 
-    has_castled = False
+    __slots__ = ()
+    letter = "R"
 
-    def __init__(self, pos: str, color: Color) -> None:
-        super().__init__(pos, color)
-        self.symbol = "wR" if self.color == Color.WHITE else "bR"
-        self.img = pygame.transform.scale(
-            ci.WHITE_ROOK if self.color == Color.WHITE else ci.BLACK_ROOK, (70, 70)
-        )
-
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
         if self.square_in_board(target):
-            if target[0] == self.pos[0] or target[1] == self.pos[1]:
+            if target[0] == pos[0] or target[1] == pos[1]:
                 return True
         return False
 
@@ -61,19 +80,13 @@ class Rook(Piece):
 class Bishop(Piece):
     """Bishop class"""
 
-    def __init__(self, pos: str, color: Color) -> None:
-        super().__init__(pos, color)
-        self.symbol = "wB" if self.color == Color.WHITE else "bB"
-        self.img = pygame.transform.scale(
-            ci.WHITE_BISHOP if self.color == Color.WHITE else ci.BLACK_BISHOP, (70, 70)
-        )
+    __slots__ = ()
+    letter = "B"
 
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
         if self.square_in_board(target):
-            if abs(ord(target[0]) - ord(self.pos[0])) == abs(
-                int(target[1]) - int(self.pos[1])
-            ):
+            if abs(ord(target[0]) - ord(pos[0])) == abs(int(target[1]) - int(pos[1])):
                 return True
         return False
 
@@ -81,21 +94,15 @@ class Bishop(Piece):
 class Queen(Piece):
     """Queen class"""
 
-    def __init__(self, pos: str, color: Color) -> None:
-        super().__init__(pos, color)
-        self.symbol = "wQ" if self.color == Color.WHITE else "bQ"
-        self.img = pygame.transform.scale(
-            ci.WHITE_QUEEN if self.color == Color.WHITE else ci.BLACK_QUEEN, (70, 70)
-        )
+    __slots__ = ()
+    letter = "Q"
 
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
         if self.square_in_board(target):
-            if target[0] == self.pos[0] or target[1] == self.pos[1]:
+            if target[0] == pos[0] or target[1] == pos[1]:
                 return True
-            elif abs(ord(target[0]) - ord(self.pos[0])) == abs(
-                int(target[1]) - int(self.pos[1])
-            ):
+            elif abs(ord(target[0]) - ord(pos[0])) == abs(int(target[1]) - int(pos[1])):
                 return True
         return False
 
@@ -103,38 +110,25 @@ class Queen(Piece):
 class King(Piece):
     """King class"""
 
-    in_check = False
-    has_castled = False
-
-    def __init__(self, pos: str, color: Color) -> None:
-        super().__init__(pos, color)
-        self.symbol = "wK" if self.color == Color.WHITE else "bK"
-        self.img = pygame.transform.scale(
-            ci.WHITE_KING if self.color == Color.WHITE else ci.BLACK_KING, (70, 70)
-        )
+    __slots__ = ()
+    letter = "K"
 
-    def castle(self, target: str) -> bool:
-        """Return True if the king wants to castle and do not care whether it is a valid move"""
+    def castle(self, pos: str, target: str) -> bool:
+        """Return True if the king at pos wants to castle and do not care whether it is a valid move"""
         if self.square_in_board(target):
-            if target[1] == self.pos[1] and abs(ord(target[0]) - ord(self.pos[0])) == 2:
+            if target[1] == pos[1] and abs(ord(target[0]) - ord(pos[0])) == 2:
                 return True
         return False
 
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
         if self.square_in_board(target):
             if (
-                abs(ord(target[0]) - ord(self.pos[0])) <= 1
-                and abs(int(target[1]) - int(self.pos[1])) <= 1
+                abs(ord(target[0]) - ord(pos[0])) <= 1
+                and abs(int(target[1]) - int(pos[1])) <= 1
             ):
                 return True
-            elif (
-                target[1] == self.pos[1]
-                and abs(ord(target[0]) - ord(self.pos[0])) == 2
-                and not self.has_castled
-                and not self.in_check
-                and self.pos[0] == "e"
-            ):
+            elif pos[0] == "e" and self.castle(pos, target):  # Board.can_castle decides
                 return True
         return False
 
@@ -142,24 +136,20 @@ class King(Piece):
 class Knight(Piece):
     """Knight class"""
 
-    def __init__(self, pos: str, color: Color) -> None:
-        super().__init__(pos, color)
-        self.symbol = "wN" if self.color == Color.WHITE else "bN"
-        self.img = pygame.transform.scale(
-            ci.WHITE_KNIGHT if self.color == Color.WHITE else ci.BLACK_KNIGHT, (70, 70)
-        )
+    __slots__ = ()
+    letter = "N"
 
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
         if self.square_in_board(target):
             if (
-                abs(ord(target[0]) - ord(self.pos[0])) == 2
-                and abs(int(target[1]) - int(self.pos[1])) == 1
+                abs(ord(target[0]) - ord(pos[0])) == 2
+                and abs(int(target[1]) - int(pos[1])) == 1
             ):
                 return True
             elif (
-                abs(ord(target[0]) - ord(self.pos[0])) == 1
-                and abs(int(target[1]) - int(self.pos[1])) == 2
+                abs(ord(target[0]) - ord(pos[0])) == 1
+                and abs(int(target[1]) - int(pos[1])) == 2
             ):
                 return True
         return False
@@ -168,24 +158,18 @@ class Knight(Piece):
 class Pawn(Piece):
     """Pawn class"""
 
-    jump = False  # If the pawn moves two squares, jump will be True
+    __slots__ = ()
+    letter = "P"
 
-    def __init__(self, pos: str, color: Color) -> None:
-        super().__init__(pos, color)
-        self.symbol = "wP" if self.color == Color.WHITE else "bP"
-        self.img = pygame.transform.scale(
-            ci.WHITE_PAWN if self.color == Color.WHITE else ci.BLACK_PAWN, (70, 70)
-        )
-
-    def move_diagonal(self, target: str, color: Color) -> bool:
-        """Check if the pawn is moving diagonally"""
+    def move_diagonal(self, pos: str, target: str, color: Color) -> bool:
+        """Check if the pawn at pos is moving diagonally"""
         if color == Color.WHITE:
-            if abs(ord(target[0]) - ord(self.pos[0])) == 1:
-                if int(target[1]) - int(self.pos[1]) == 1:
+            if abs(ord(target[0]) - ord(pos[0])) == 1:
+                if int(target[1]) - int(pos[1]) == 1:
                     return True
         else:
-            if abs(ord(target[0]) - ord(self.pos[0])) == 1:
-                if int(target[1]) - int(self.pos[1]) == -1:
+            if abs(ord(target[0]) - ord(pos[0])) == 1:
+                if int(target[1]) - int(pos[1]) == -1:
                     return True
         return False
 
@@ -199,25 +183,35 @@ class Pawn(Piece):
                 return True
         return False
 
-    def can_move(self, target: str) -> bool:
-        """Return True if the piece can move to the target and do not care whether it is valid"""
+    def can_move(self, pos: str, target: str) -> bool:
+        """Return True if the piece at pos can move to the target and do not care whether it is valid"""
         if self.square_in_board(target):
             if self.color == Color.WHITE:
-                if target[0] == self.pos[0]:
-                    if int(target[1]) - int(self.pos[1]) == 1:
+                if target[0] == pos[0]:
+                    if int(target[1]) - int(pos[1]) == 1:
                         return True
-                    elif int(target[1]) - int(self.pos[1]) == 2 and self.pos[1] == "2":
-                        self.jump = True
+                    elif int(target[1]) - int(pos[1]) == 2 and pos[1] == "2":
                         return True
-                else:
-                    return self.move_diagonal(target, self.color)  # Capture diagonally
+                else:  # Capture diagonally
+                    return self.move_diagonal(pos, target, self.color)
             elif self.color == Color.BLACK:
-                if target[0] == self.pos[0]:
-                    if int(target[1]) - int(self.pos[1]) == -1:
+                if target[0] == pos[0]:
+                    if int(target[1]) - int(pos[1]) == -1:
                         return True
-                    elif int(target[1]) - int(self.pos[1]) == -2 and self.pos[1] == "7":
-                        self.jump = True
+                    elif int(target[1]) - int(pos[1]) == -2 and pos[1] == "7":
                         return True
-                else:
-                    return self.move_diagonal(target, self.color)  # Capture diagonally
+                else:  # Capture diagonally
+                    return self.move_diagonal(pos, target, self.color)
         return False
+
+
+SHARED_PIECES: dict[tuple[type, Color], Piece] = {
+    (piece_type, color): piece_type(color)
+    for piece_type in (Pawn, Knight, Bishop, Rook, Queen, King)
+    for color in (Color.WHITE, Color.BLACK)
+}
+
+
+def get_shared_piece(piece_type: type, color: Color) -> Piece:
+    """Return the one instance of the given type and color"""
+    return SHARED_PIECES[piece_type, color]
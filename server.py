@@ -0,0 +1,534 @@
+"""
+Host many games at once over TCP, one JSON object per line
+
+Each game is kept as its Board.to_bytes encoding and its last MAX_MOVES moves, so a game
+takes the same memory however long it lasts. Moves are checked and played by a pool of
+worker processes, the event loop only reads, routes and writes messages. After every move
+the players of the game get the squares that changed, the side to move and its moves.
+
+Requests, each answered with a reply of the same id:
+    {"id": 1, "op": "new", "fen": "<FEN>"}              the fen is optional
+    {"id": 2, "op": "join", "game": 7}                  watch or play a game
+    {"id": 3, "op": "move", "game": 7, "move": "e2e4"}  e7e8q to promote
+    {"id": 4, "op": "leave", "game": 7}
+The other players of a game are sent {"game": 7, "move": "e2e4", "ply": 1, "diff": ...}.
+A request that fails is answered with {"id": 3, "error": "illegal move"}.
+A client can send requests without waiting for the replies. The requests of a connection on
+one game are answered in the order they were sent, and after the new games sent before them,
+so a move sent right after the "new" that made its game finds it. Other replies can come back
+in any order.
+
+Examples:
+    python server.py serve --port 8765 --workers 2
+    python server.py load --port 8765 --games 2000 --moves 40
+"""
+from board import *
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Union
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_GAMES = 10000  # Games without players are dropped, least recently played first
+MAX_MOVES = 64  # Moves of a game kept for players who join it later
+MAX_PENDING = 256  # Requests of one connection being answered at once
+MAX_BUFFER = 1 << 20  # Bytes queued for a client before it is dropped for not reading
+WORKER_BOARDS = 256  # Boards a worker keeps, the next move of a game needs no rebuild
+
+
+class RequestError(ValueError):
+    """A request that can't be answered, its message is sent back to the client"""
+
+
+class Game:
+    """A game on the server, the board itself only lives in the workers"""
+
+    __slots__ = ("position", "ply", "moves", "players", "lock")
+
+    def __init__(self, position: bytes):
+        self.position: bytes = position
+        self.ply: int = 0
+        self.moves: deque = deque(maxlen=MAX_MOVES)
+        self.players: set[asyncio.StreamWriter] = set()
+        self.lock = asyncio.Lock()  # One move at a time
+
+
+class LoadReport(NamedTuple):
+    games: int
+    moves: int
+    seconds: float
+    latencies: list[float]  # Seconds from sending a move to its reply, sorted
+
+    @property
+    def moves_per_second(self) -> float:
+        return self.moves / max(self.seconds, 1e-9)
+
+    def get_percentile(self, percent: float) -> float:
+        if not self.latencies:
+            return 0.0
+        index: int = min(
+            int(len(self.latencies) * percent / 100), len(self.latencies) - 1
+        )
+        return self.latencies[index]
+
+
+class GameServer:
+    """
+    - Keeps the games by id, at most max_games of them
+    - Checks and plays moves in a pool of worker processes, or in the event loop without workers
+    """
+
+    def __init__(self, workers: int = 1, max_games: int = MAX_GAMES):
+        self.games: OrderedDict[int, Game] = OrderedDict()  # Least recently played first
+        self.max_games = max_games
+        self.next_game = 1
+        self.pool: Union[ProcessPoolExecutor, None] = None
+        if workers:
+            self.pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def call(self, function, *args):
+        """Run a function of this module in the pool"""
+        if self.pool is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, function, *args
+        )
+
+    async def serve(self, host: str = HOST, port: int = PORT) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info("serving on %s:%d", host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the requests of one connection, several at a time but in order for each game"""
+        joined: set[int] = set()
+        pending = asyncio.Semaphore(MAX_PENDING)
+        tasks: set[asyncio.Task] = set()
+        # The last request on each game not answered yet, under None the last one naming no game
+        last: dict[Union[int, None], asyncio.Task] = {}
+        try:
+            while line := await reader.readline():
+                await pending.acquire()
+                request = get_request(line)
+                key: Union[int, None] = get_request_game(request)
+                after: set[asyncio.Task] = {
+                    task for task in (last.get(None), last.get(key)) if task is not None
+                }
+                task = asyncio.create_task(self.answer(request, writer, joined, after))
+                last[key] = task
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                task.add_done_callback(lambda _: pending.release())
+
+                def forget(done: asyncio.Task, key: Union[int, None] = key) -> None:
+                    if last.get(key) is done:
+                        del last[key]
+
+                task.add_done_callback(forget)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as error:
+            logger.info("connection dropped: %s", error)
+        finally:
+            if tasks:
+                await asyncio.wait(tasks)
+            for game_id in joined:
+                game: Union[Game, None] = self.games.get(game_id)
+                if game is not None:
+                    game.players.discard(writer)
+            writer.close()
+
+    async def answer(
+        self,
+        request: Union[dict, None],
+        writer: asyncio.StreamWriter,
+        joined: set[int],
+        after: set[asyncio.Task],
+    ):
+        """Answer a request once the requests it must follow are answered"""
+        if after:
+            await asyncio.wait(after)
+        request_id = None
+        try:
+            if request is None:
+                raise RequestError("not JSON")
+            if not isinstance(request, dict):
+                raise RequestError("a request must be an object")
+            request_id = request.get("id")
+            op = request.get("op")
+            if op == "new":
+                reply: dict = await self.new_game(request, writer, joined)
+            elif op == "join":
+                reply = await self.join_game(request, writer, joined)
+            elif op == "move":
+                reply = await self.play_move(request, writer)
+            elif op == "leave":
+                game_id: int = self.get_game_id(request)
+                joined.discard(game_id)
+                self.games[game_id].players.discard(writer)
+                reply = {"game": game_id}
+            else:
+                raise RequestError(f"unknown op {op!r}")
+        except RequestError as error:
+            reply = {"error": str(error)}
+        except Exception:
+            logger.exception("failed to answer %r", request)
+            reply = {"error": "server error"}
+        reply["id"] = request_id
+        send(writer, reply)
+
+    def get_game_id(self, request: dict) -> int:
+        game_id = request.get("game")
+        if not isinstance(game_id, int) or game_id not in self.games:
+            raise RequestError(f"no game {game_id!r}")
+        return game_id
+
+    async def new_game(
+        self, request: dict, writer: asyncio.StreamWriter, joined: set[int]
+    ) -> dict:
+        fen = request.get("fen", START_FEN)
+        if not isinstance(fen, str):
+            raise RequestError("the fen must be a string")
+        started: Union[tuple, None] = await self.call(start_game, fen)
+        if started is None:
+            raise RequestError("bad fen")
+        position, state = started
+        self.make_room()
+        game_id: int = self.next_game
+        self.next_game += 1
+        game = Game(position)
+        game.players.add(writer)
+        self.games[game_id] = game
+        joined.add(game_id)
+        return {"game": game_id, "ply": 0, **state}
+
+    def make_room(self) -> None:
+        """Drop the least recently played game without players if there are max_games"""
+        if len(self.games) < self.max_games:
+            return
+        for game_id, game in self.games.items():
+            if not game.players:
+                del self.games[game_id]
+                return
+        raise RequestError("too many games")
+
+    async def join_game(
+        self, request: dict, writer: asyncio.StreamWriter, joined: set[int]
+    ) -> dict:
+        game_id: int = self.get_game_id(request)
+        game: Game = self.games[game_id]
+        async with game.lock:  # Not in the middle of a move
+            state: dict = await self.call(describe, game.position)
+            game.players.add(writer)
+            joined.add(game_id)
+            return {
+                "game": game_id,
+                "ply": game.ply,
+                "last_moves": list(game.moves),
+                **state,
+            }
+
+    async def play_move(self, request: dict, writer: asyncio.StreamWriter) -> dict:
+        game_id: int = self.get_game_id(request)
+        move = request.get("move")
+        if not isinstance(move, str):
+            raise RequestError("the move must be a string like e2e4")
+        game: Game = self.games[game_id]
+        async with game.lock:
+            played: Union[tuple, None] = await self.call(play, game.position, move)
+            if played is None:
+                raise RequestError("illegal move")
+            game.position, diff, state = played
+            game.ply += 1
+            game.moves.append(move)
+        if game_id in self.games:  # Not dropped meanwhile
+            self.games.move_to_end(game_id)
+        update: dict = {
+            "game": game_id,
+            "move": move,
+            "ply": game.ply,
+            "diff": diff,
+            **state,
+        }
+        for player in list(game.players):
+            if player is not writer:
+                send(player, update)
+        return update
+
+
+def send(writer: asyncio.StreamWriter, message: dict) -> None:
+    """Queue a message to a client, dropping a client that stopped reading"""
+    if writer.is_closing():
+        return
+    if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+        logger.info("dropping a client that doesn't read")
+        writer.close()
+        return
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+# The boards of a worker process by position, to skip rebuilding the board of the last move
+worker_boards: OrderedDict[bytes, Board] = OrderedDict()
+
+
+def start_game(fen: str) -> Union[tuple, None]:
+    """Return the (position, state) of a FEN, None if it can't be read"""
+    try:
+        board = Board(fen)
+    except (ValueError, IndexError, KeyError):
+        return None
+    if len(board.get_piece_positions(Color.WHITE, King)) != 1:
+        return None
+    if len(board.get_piece_positions(Color.BLACK, King)) != 1:
+        return None
+    return board.to_bytes(), {"fen": board.to_fen(), **get_state(board)}
+
+
+def describe(position: bytes) -> dict:
+    """Return the FEN and state of a position"""
+    board: Board = Board.from_bytes(position)
+    return {"fen": board.to_fen(), **get_state(board)}
+
+
+def play(position: bytes, name: str) -> Union[tuple, None]:
+    """Return the (position, diff, state) after the move, None if it is illegal"""
+    board: Union[Board, None] = worker_boards.pop(position, None)
+    if board is None:
+        board = Board.from_bytes(position)
+    move: Union[tuple, None] = parse_move(board, name)
+    if move is None:
+        worker_boards[position] = board
+        return None
+    board.make_move(*move)
+    new_position: bytes = board.to_bytes()
+    worker_boards[new_position] = board
+    if len(worker_boards) > WORKER_BOARDS:
+        worker_boards.popitem(last=False)
+    return new_position, get_diff(position, new_position), get_state(board)
+
+
+def get_request(line: bytes) -> Union[dict, None]:
+    """Return the decoded request of a line, None if it isn't JSON"""
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def get_request_game(request: Union[dict, None]) -> Union[int, None]:
+    """Return the game a request names, None for a new game or a request that names none"""
+    game_id = request.get("game") if isinstance(request, dict) else None
+    return game_id if isinstance(game_id, int) else None
+
+
+def parse_move(board: Board, name: str) -> Union[tuple, None]:
+    """Return the (pos, target, promote_type) of a legal move named like e2e4 or e7e8q"""
+    pos, target, letter = name[:2], name[2:4], name[4:]
+    if pos not in SQUARE_INDEXES or target not in SQUARE_INDEXES:
+        return None
+    piece: Union[Piece, None] = board.get_piece(pos)
+    if piece is None or piece.color != board.turn:
+        return None
+    if target not in board.get_legal_moves(pos):
+        return None
+    if isinstance(piece, Pawn) and piece.can_promote(target):
+        promote_type: Union[type, None] = FEN_PIECES.get(letter)
+        if promote_type not in PROMOTION_TYPES:
+            return None
+        return pos, target, promote_type
+    return (pos, target, None) if not letter else None
+
+
+def get_state(board: Board) -> dict:
+    """Return the side to move, check, result and legal moves of a board"""
+    status: GameStatus = board.get_status()
+    result: Union[str, None] = None
+    if status.checkmate:
+        result = "0-1" if board.turn == Color.WHITE else "1-0"
+    elif status.is_over:
+        result = "1/2-1/2"
+    moves: list[str] = [get_move_name(*move) for move in board.get_moves()]
+    return {
+        "turn": "w" if board.turn == Color.WHITE else "b",
+        "check": status.in_check,
+        "result": result,
+        "moves": moves,
+    }
+
+
+def get_diff(old: bytes, new: bytes) -> dict[str, Union[str, None]]:
+    """Return the squares that changed between two positions and what is on them now"""
+    diff: dict[str, Union[str, None]] = {}
+    old_nibbles: list[int] = decode_position(old)[2]
+    new_nibbles: list[int] = decode_position(new)[2]
+    for index, (old_nibble, new_nibble) in enumerate(zip(old_nibbles, new_nibbles)):
+        old_piece: Union[tuple, None] = NIBBLE_PIECES.get(old_nibble)
+        new_piece: Union[tuple, None] = NIBBLE_PIECES.get(new_nibble)
+        if old_piece != new_piece:
+            diff[SQUARE_NAMES[index]] = (
+                None if new_piece is None else get_symbol(*new_piece)
+            )
+    return diff
+
+
+def get_symbol(piece_type: type, color: Color) -> str:
+    return get_shared_piece(piece_type, color).symbol
+
+
+class Connection:
+    """A client connection that matches the replies to the requests by id"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 1
+        self.waiting: dict[int, asyncio.Future] = {}
+        self.updates = 0  # Moves of other players pushed to this connection
+        self.reading: asyncio.Task = asyncio.create_task(self.read())
+
+    @classmethod
+    async def open(cls, host: str = HOST, port: int = PORT) -> "Connection":
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def read(self) -> None:
+        while line := await self.reader.readline():
+            message: dict = json.loads(line)
+            future: Union[asyncio.Future, None] = self.waiting.pop(
+                message.get("id"), None
+            )
+            if future is not None:
+                future.set_result(message)
+            else:
+                self.updates += 1
+        for future in self.waiting.values():
+            future.set_exception(ConnectionError("the server closed the connection"))
+
+    async def request(self, **request) -> dict:
+        request["id"] = self.next_id
+        self.next_id += 1
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.waiting[request["id"]] = future
+        self.writer.write(json.dumps(request, separators=(",", ":")).encode() + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def close(self) -> None:
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.reading.cancel()
+
+
+async def play_random_game(
+    connection: Connection, moves: int, rng: random.Random, latencies: list[float]
+) -> int:
+    """Play up to the given number of random moves in a new game, return how many were played"""
+    reply: dict = await connection.request(op="new")
+    game_id: int = reply["game"]
+    played = 0
+    while played < moves and reply["result"] is None:
+        move: str = rng.choice(reply["moves"])
+        start: float = time.perf_counter()
+        reply = await connection.request(op="move", game=game_id, move=move)
+        latencies.append(time.perf_counter() - start)
+        if "error" in reply:
+            raise RuntimeError(f"game {game_id}: {move} {reply['error']}")
+        played += 1
+    await connection.request(op="leave", game=game_id)
+    return played
+
+
+async def run_load(
+    host: str = HOST,
+    port: int = PORT,
+    games: int = 1000,
+    moves: int = 40,
+    connections: int = 50,
+    seed: int = 0,
+) -> LoadReport:
+    """Play the games at the same time over the connections and time every move"""
+    clients: list[Connection] = [
+        await Connection.open(host, port) for _ in range(min(connections, games))
+    ]
+    rng = random.Random(seed)
+    latencies: list[float] = []
+    start: float = time.perf_counter()
+    played: list[int] = await asyncio.gather(
+        *(
+            play_random_game(clients[game % len(clients)], moves, rng, latencies)
+            for game in range(games)
+        )
+    )
+    seconds: float = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+    return LoadReport(games, sum(played), seconds, sorted(latencies))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Host games over TCP or load-test a server"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="host games")
+    serve.add_argument("--host", default=HOST, help=f"defaults to {HOST}")
+    serve.add_argument("--port", type=int, default=PORT, help=f"defaults to {PORT}")
+    serve.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="processes that check moves, one per CPU by default, 0 for none",
+    )
+    serve.add_argument(
+        "--max-games", type=int, default=MAX_GAMES, help=f"defaults to {MAX_GAMES}"
+    )
+    load = commands.add_parser("load", help="play random games against a server")
+    load.add_argument("--host", default=HOST, help=f"defaults to {HOST}")
+    load.add_argument("--port", type=int, default=PORT, help=f"defaults to {PORT}")
+    load.add_argument("--games", type=int, default=1000, help="games played at once")
+    load.add_argument("--moves", type=int, default=40, help="moves per game at most")
+    load.add_argument("--connections", type=int, default=50, help="defaults to 50")
+    load.add_argument("--seed", type=int, default=0, help="seed of the random moves")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        server = GameServer(args.workers, args.max_games)
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+        return
+    report: LoadReport = asyncio.run(
+        run_load(
+            args.host, args.port, args.games, args.moves, args.connections, args.seed
+        )
+    )
+    print(
+        f"{report.games} games, {report.moves} moves in {report.seconds:.3f}s "
+        f"({report.moves_per_second:.0f} moves/s), latency "
+        f"p50 {report.get_percentile(50) * 1000:.1f}ms "
+        f"p99 {report.get_percentile(99) * 1000:.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Work out the next positions while the player thinks
+
+Before the game can draw a position it needs the legal moves and the status of the side to
+move. Speculator plays each move of the player on a background thread and keeps what the
+position after it needs in a bounded LRU keyed by Board.hash, so once the player moves it
+is a lookup instead of a move generation.
+"""
+from board import *
+from evaluation import PIECE_VALUES
+from collections import OrderedDict
+from typing import NamedTuple, Union
+import threading
+
+CACHE_SIZE = 1024  # Positions kept, enough for the replies of a few dozen moves
+
+
+class Prediction(NamedTuple):
+    """What drawing a position needs, worked out ahead of time"""
+
+    turn_moves: dict[str, list[str]]
+    status: GameStatus
+
+
+class Speculator:
+    """
+    - start works out the positions after every move of a board on a background thread
+    - get_status returns the status of a position, from the predictions if they have it
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.predictions: OrderedDict[int, Prediction] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stop_event = threading.Event()
+        self.thread: Union[threading.Thread, None] = None
+
+    def start(self, board: Board) -> threading.Thread:
+        """Predict the positions after each move of the board, most likely moves first"""
+        self.stop()
+        self.stop_event.clear()
+        board = board.copy()  # The caller keeps using its own board
+        self.thread = threading.Thread(
+            target=self.run, args=(board,), name="speculator", daemon=True
+        )
+        self.thread.start()
+        return self.thread
+
+    def stop(self) -> None:
+        """Stop predicting, waiting at most for the position being worked out"""
+        if self.thread is not None and self.thread.is_alive():
+            self.stop_event.set()
+            self.thread.join()
+        self.thread = None
+
+    def run(self, board: Board) -> None:
+        for pos, target, promote_type in get_likely_moves(board):
+            if self.stop_event.is_set():
+                return
+            undo: Undo = board.make_move(pos, target, promote_type)
+            if self.get(board.hash) is None:
+                self.store(board.hash, predict(board))
+            board.unmake_move(undo)
+
+    def get(self, key: int) -> Union[Prediction, None]:
+        """Return the prediction of the position with the given hash, None if there is none"""
+        with self.lock:
+            prediction: Union[Prediction, None] = self.predictions.get(key)
+            if prediction is not None:
+                self.predictions.move_to_end(key)
+            return prediction
+
+    def store(self, key: int, prediction: Prediction) -> None:
+        """Keep a prediction, dropping the least recently used one when full"""
+        with self.lock:
+            self.predictions[key] = prediction
+            self.predictions.move_to_end(key)
+            if len(self.predictions) > self.size:
+                self.predictions.popitem(last=False)
+
+    def get_status(self, board: Board) -> GameStatus:
+        """
+        - Return the status of the board and give it its legal moves if they were predicted
+        - Work them out now otherwise
+        """
+        prediction: Union[Prediction, None] = self.get(board.hash)
+        if prediction is None:
+            self.misses += 1
+            return board.get_status()
+        self.hits += 1
+        board.turn_moves = prediction.turn_moves
+        board.turn_moves_hash = board.hash
+        return prediction.status
+
+    def clear(self) -> None:
+        self.stop()
+        with self.lock:
+            self.predictions.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def predict(board: Board) -> Prediction:
+    """Work out the legal moves and status of the side to move"""
+    status: GameStatus = board.get_status()
+    return Prediction(board.get_turn_moves(), status)
+
+
+def get_likely_moves(board: Board) -> list[tuple]:
+    """Return the (pos, target, promote_type) moves of the side to move, captures of the most valuable pieces first"""
+    moves: list[tuple] = board.get_moves()
+
+    def get_order(move: tuple) -> int:
+        victim: Union[Piece, None] = board.get_piece(move[1])
+        score: int = 0 if victim is None else PIECE_VALUES[type(victim)]
+        return score + (PIECE_VALUES[move[2]] if move[2] is not None else 0)
+
+    moves.sort(key=get_order, reverse=True)
+    return moves
@@ -0,0 +1,53 @@
+"""Scale every piece image once and share it between all pieces"""
+import pygame
+from pygame import Surface
+from typing import Union
+import chess_items as ci
+
+PIECE_SIZE = 70
+
+# Symbol: name of the image in chess_items
+PIECE_IMAGES: dict[str, str] = {
+    "wP": "WHITE_PAWN",
+    "wR": "WHITE_ROOK",
+    "wN": "WHITE_KNIGHT",
+    "wB": "WHITE_BISHOP",
+    "wQ": "WHITE_QUEEN",
+    "wK": "WHITE_KING",
+    "bP": "BLACK_PAWN",
+    "bR": "BLACK_ROOK",
+    "bN": "BLACK_KNIGHT",
+    "bB": "BLACK_BISHOP",
+    "bQ": "BLACK_QUEEN",
+    "bK": "BLACK_KING",
+}
+
+_scaled: dict[tuple, Surface] = {}
+_converted: dict[tuple, Surface] = {}
+_display: Union[Surface, None] = None  # The display the converted sprites were made for
+
+
+def get_sprite(symbol: str, size: int = PIECE_SIZE) -> Surface:
+    """
+    - Return the image of the piece with the given symbol scaled to size x size
+    - Once a display is open, return a copy converted to its pixel format so blits are fast
+    """
+    global _display
+    key = (symbol, size)
+    sprite: Union[Surface, None] = _scaled.get(key)
+    if sprite is None:
+        image: Surface = getattr(ci, PIECE_IMAGES[symbol])
+        sprite = pygame.transform.scale(image, (size, size))
+        _scaled[key] = sprite
+
+    display: Union[Surface, None] = pygame.display.get_surface()
+    if display is None:
+        return sprite
+    if display is not _display:  # A new display mode needs new conversions
+        _converted.clear()
+        _display = display
+    converted: Union[Surface, None] = _converted.get(key)
+    if converted is None:
+        converted = sprite.convert_alpha()
+        _converted[key] = converted
+    return converted
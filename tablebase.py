@@ -0,0 +1,358 @@
+"""
+Endgame tablebases: the distance to mate of every position of a few small endgames
+
+The tables are made by retrograde analysis (python tablebase.py generate) and saved as
+NumPy .npy files in tablebases/. They are read back with np.load(mmap_mode="r"), so a probe
+only reads the page it needs.
+
+A table is an int8 array indexed by [turn, white king, black king, white pieces...] with
+square indexes like Board (a8 is 0) and turn 0 when white is to move. White is always the
+side with the pieces; a position where black has them is probed mirrored.
+A value of 0 is a draw (or an impossible position). Otherwise abs(value) - 1 is the number
+of plies to mate, and the value is positive when the side to move mates.
+Probing needs NumPy but the game doesn't: without it every probe misses.
+"""
+from __future__ import annotations
+from board import *
+import argparse
+import os
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TABLES_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+# Name: the pieces of the strong side besides its king, in the order of the table
+ENDGAMES: dict[str, tuple[type]] = {
+    "KQK": (Queen,),
+    "KRK": (Rook,),
+    "KPK": (Pawn,),
+    "KBNK": (Bishop, Knight),
+}
+# The tables a pawn promotes into, underpromotions to a bishop or knight only draw
+PROMOTIONS: dict[type, str] = {Queen: "KQK", Rook: "KRK"}
+
+# Dimensions of a table for one side to move
+WHITE_KING, BLACK_KING = 0, 1
+NO_MATE = 127
+
+tables: dict[str, np.ndarray] = {}
+
+
+def get_table(name: str) -> Union[np.ndarray, None]:
+    """Return the table of the endgame memory-mapped, None if it or NumPy is missing"""
+    if np is None:
+        return None
+    table: Union[np.ndarray, None] = tables.get(name)
+    if table is None:
+        path = os.path.join(TABLES_DIR, name + ".npy")
+        if not os.path.exists(path):
+            return None
+        table = np.load(path, mmap_mode="r")
+        tables[name] = table
+    return table
+
+
+def get_endgame(board: Board) -> Union[tuple[str, Color], None]:
+    """Return the name of the table of the board and the color with the pieces, if there is one"""
+    board.ensure_built()
+    counts: dict[Color, list[type]] = {}
+    for color in (Color.WHITE, Color.BLACK):
+        if len(board.piece_squares[color][King]) != 1:
+            return None
+        counts[color] = [
+            piece_type
+            for piece_type, squares in board.piece_squares[color].items()
+            for _ in squares
+            if piece_type is not King
+        ]
+    for strong, weak in ((Color.WHITE, Color.BLACK), (Color.BLACK, Color.WHITE)):
+        if counts[weak]:
+            continue
+        for name, piece_types in ENDGAMES.items():
+            if sorted(counts[strong], key=PIECE_TYPES.index) == sorted(
+                piece_types, key=PIECE_TYPES.index
+            ):
+                return name, strong
+    return None
+
+
+def probe(board: Board) -> Union[int, None]:
+    """Return the table value of the board for the side to move, None if no table covers it"""
+    if board.count_piece_on_board() > 4:
+        return None
+    endgame: Union[tuple[str, Color], None] = get_endgame(board)
+    if endgame is None:
+        return None
+    name, strong = endgame
+    table: Union[np.ndarray, None] = get_table(name)
+    if table is None:
+        return None
+    weak: Color = get_opposite_color(strong)
+    mirror = 56 if strong == Color.BLACK else 0  # Flip the ranks so that black plays up
+
+    index: list[int] = [0 if board.turn == strong else 1]
+    index.append(get_index(board.get_king_pos(strong)) ^ mirror)
+    index.append(get_index(board.get_king_pos(weak)) ^ mirror)
+    for piece_type in ENDGAMES[name]:
+        index.append(
+            get_index(next(iter(board.piece_squares[strong][piece_type]))) ^ mirror
+        )
+    return int(table[tuple(index)])
+
+
+def get_mate_plies(value: int) -> Union[int, None]:
+    """The number of plies to mate of a table value, None for a draw"""
+    return abs(value) - 1 if value else None
+
+
+def get_moves_from(piece_type: type, index: int) -> list[tuple[int, tuple[int]]]:
+    """Return the (target, squares in between) moves of a white piece on the square index"""
+    if piece_type is King:
+        return [(target, ()) for target in KING_SQUARES[index]]
+    if piece_type is Knight:
+        return [(target, ()) for target in KNIGHT_SQUARES[index]]
+    if piece_type is Pawn:
+        if index // 8 in (0, 7):
+            return []
+        moves: list[tuple[int, tuple[int]]] = [(index - 8, ())]
+        if index // 8 == 6:
+            moves.append((index - 16, (index - 8,)))
+        return moves
+    if piece_type is Rook:
+        rays = ROOK_RAYS[index]
+    elif piece_type is Bishop:
+        rays = BISHOP_RAYS[index]
+    else:
+        rays = ROOK_RAYS[index] + BISHOP_RAYS[index]
+    return [(ray[step], ray[:step]) for ray in rays for step in range(len(ray))]
+
+
+def get_attacks_from(piece_type: type, index: int) -> list[tuple[int, tuple[int]]]:
+    """Return the (target, squares in between) attacks of a white piece on the square index"""
+    if piece_type is Pawn:
+        return [(target, ()) for target in PAWN_CAPTURES[Color.WHITE][index]]
+    return get_moves_from(piece_type, index)
+
+
+def get_view(array: np.ndarray, fixed: dict[int, int]) -> np.ndarray:
+    """Return the view of the array with the given dimensions fixed to the given squares"""
+    index: list = [slice(None)] * array.ndim
+    for dim, square in fixed.items():
+        index[dim] = square
+    return array[tuple(index)]
+
+
+def get_clear(
+    ndim: int, fixed: tuple[int], blockers: list[int], between: tuple[int]
+) -> Union[np.ndarray, bool]:
+    """
+    - For the view of an ndim table with the fixed dimensions taken out, return where
+      none of the pieces of the blocker dimensions stands on a square in between
+    """
+    if not between:
+        return True
+    squares = np.zeros(64, dtype=bool)
+    squares[list(between)] = True
+    remaining: list[int] = [dim for dim in range(ndim) if dim not in fixed]
+    blocked = np.zeros((64,) * len(remaining), dtype=bool)
+    for dim in blockers:
+        if dim in remaining:
+            shape = [1] * len(remaining)
+            shape[remaining.index(dim)] = 64
+            blocked = blocked | squares.reshape(shape)
+    return ~blocked
+
+
+def get_coordinates(ndim: int, dim: int) -> np.ndarray:
+    """The square of the piece of a dimension, shaped to broadcast over an ndim table"""
+    shape = [1] * ndim
+    shape[dim] = 64
+    return np.arange(64).reshape(shape)
+
+
+def get_attacked(
+    pieces: tuple[type], target: int, attackers: list[int], blockers: list[int]
+) -> np.ndarray:
+    """Return where the square of the piece of the target dimension is attacked by the attackers"""
+    ndim = len(pieces)
+    attacked = np.zeros((64,) * ndim, dtype=bool)
+    for dim in attackers:
+        for square in range(64):
+            for target_square, between in get_attacks_from(pieces[dim], square):
+                fixed = (dim, target) if dim < target else (target, dim)
+                view = get_view(attacked, {dim: square, target: target_square})
+                view |= get_clear(ndim, fixed, blockers, between)
+    return attacked
+
+
+def generate(name: str) -> np.ndarray:
+    """Work out the table of the endgame by retrograde analysis"""
+    pieces: tuple[type] = (King, King) + ENDGAMES[name]
+    ndim = len(pieces)
+    shape = (64,) * ndim
+    white_dims: list[int] = [WHITE_KING] + list(range(2, ndim))
+    coordinates: list[np.ndarray] = [get_coordinates(ndim, dim) for dim in range(ndim)]
+
+    # Positions that can't happen: two pieces on a square, touching kings, pawns on the edge
+    valid = np.ones(shape, dtype=bool)
+    for first in range(ndim):
+        for second in range(first + 1, ndim):
+            valid &= coordinates[first] != coordinates[second]
+    touching = np.zeros((64, 64), dtype=bool)
+    for square in range(64):
+        touching[square, list(KING_SQUARES[square])] = True
+    valid &= ~touching[coordinates[WHITE_KING], coordinates[BLACK_KING]]
+    for dim, piece_type in enumerate(pieces):
+        if piece_type is Pawn:
+            valid &= (coordinates[dim] >= 8) & (coordinates[dim] < 56)
+
+    # Black in check, which is only possible with black to move
+    in_check = get_attacked(pieces, BLACK_KING, white_dims, white_dims)
+    white_legal = valid & ~in_check
+    black_legal = valid
+
+    # Black escapes to a draw by taking a piece that nothing defends
+    escapes = np.zeros(shape, dtype=bool)
+    for dim in white_dims[1:]:
+        others: list[int] = [other for other in white_dims if other != dim]
+        defended = get_attacked(pieces, dim, others, others)
+        for square in range(64):
+            for target in KING_SQUARES[square]:
+                view = get_view(escapes, {BLACK_KING: square, dim: target})
+                view |= ~get_view(defended, {BLACK_KING: square, dim: target})
+    escapes &= black_legal
+    can_move = escapes | get_black_reach(white_legal)
+
+    promotion: Union[np.ndarray, None] = None
+    if Pawn in pieces:
+        promotion = get_promotion_plies(ndim, pieces.index(Pawn), coordinates)
+
+    white = np.zeros(shape, dtype=np.int8)
+    black = np.zeros(shape, dtype=np.int8)
+    lost = black_legal & in_check & ~can_move  # Checkmate
+    black[lost] = -1
+    won = np.zeros(shape, dtype=bool)
+    plies = 0
+    while True:
+        plies += 1  # White mates in plies
+        new_won = white_legal & ~won & get_white_reach(pieces, white_dims, lost)
+        if promotion is not None:
+            new_won |= white_legal & ~won & (promotion <= plies)
+        white[new_won] = plies + 1
+        won |= new_won
+
+        plies += 1  # Black is mated in plies whatever it does
+        new_lost = black_legal & can_move & ~lost & ~escapes
+        new_lost &= ~get_black_reach(white_legal & ~won)
+        black[new_lost] = -(plies + 1)
+        lost |= new_lost
+        if not new_won.any() and not new_lost.any():
+            if promotion is None or plies > promotion[promotion < NO_MATE].max(initial=0):
+                break
+        if plies + 3 > NO_MATE:
+            raise ValueError(f"{name} has mates too long to store")
+    return np.stack((white, black))
+
+
+def get_white_reach(
+    pieces: tuple[type], white_dims: list[int], targets: np.ndarray
+) -> np.ndarray:
+    """Return the positions, white to move, where a white move reaches one of the targets"""
+    ndim = len(pieces)
+    reach = np.zeros(targets.shape, dtype=bool)
+    for dim in white_dims:
+        others: list[int] = [other for other in range(ndim) if other != dim]
+        for square in range(64):
+            view = get_view(reach, {dim: square})
+            for target, between in get_moves_from(pieces[dim], square):
+                view |= get_view(targets, {dim: target}) & get_clear(
+                    ndim, (dim,), others, between
+                )
+    return reach
+
+
+def get_black_reach(targets: np.ndarray) -> np.ndarray:
+    """Return the positions, black to move, where a move of the black king reaches one of the targets"""
+    reach = np.zeros(targets.shape, dtype=bool)
+    for square in range(64):
+        view = get_view(reach, {BLACK_KING: square})
+        for target in KING_SQUARES[square]:
+            view |= get_view(targets, {BLACK_KING: target})
+    return reach
+
+
+def get_promotion_plies(
+    ndim: int, pawn: int, coordinates: list[np.ndarray]
+) -> np.ndarray:
+    """Return, white to move, the fewest plies to mate by promoting the pawn, NO_MATE if none"""
+    plies = np.full((64,) * ndim, NO_MATE, dtype=np.int16)
+    for piece_type, name in PROMOTIONS.items():
+        table: Union[np.ndarray, None] = get_table(name)
+        if table is None:
+            raise FileNotFoundError(
+                f"generate {name} before the tables that promote into it"
+            )
+        for square in range(8, 16):
+            target = square - 8
+            values = np.asarray(table[1, :, :, target], dtype=np.int16)  # Black to move
+            free = (coordinates[WHITE_KING][..., 0] != target) & (
+                coordinates[BLACK_KING][..., 0] != target
+            )
+            mate = np.where(free & (values < 0), -values, NO_MATE)
+            view = get_view(plies, {pawn: square})
+            np.minimum(view, mate, out=view)
+    return plies
+
+
+def save(name: str, table: np.ndarray) -> str:
+    """Write the table to TABLES_DIR and return its path"""
+    os.makedirs(TABLES_DIR, exist_ok=True)
+    path = os.path.join(TABLES_DIR, name + ".npy")
+    np.save(path, table)
+    tables.pop(name, None)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate or probe endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate", help="generate tables")
+    generate_parser.add_argument(
+        "names", nargs="*", help=f"some of {', '.join(ENDGAMES)}, defaults to all"
+    )
+    probe_parser = commands.add_parser("probe", help="look up a position")
+    probe_parser.add_argument("fen", help="the position")
+    args = parser.parse_args()
+    if np is None:
+        parser.error("the tables need NumPy: pip install numpy")
+
+    if args.command == "probe":
+        value: Union[int, None] = probe(Board(args.fen))
+        if value is None:
+            print("no table")
+        elif value == 0:
+            print("draw")
+        else:
+            side = "to move" if value > 0 else "not to move"
+            print(f"the side {side} mates in {get_mate_plies(value)} plies")
+        return
+    for name in args.names:
+        if name not in ENDGAMES:
+            parser.error(f"no endgame named {name}")
+    for name in args.names or ENDGAMES:
+        start = time.perf_counter()
+        table: np.ndarray = generate(name)
+        path = save(name, table)
+        longest = get_mate_plies(int(np.abs(table).max()))
+        print(
+            f"{name}: longest mate {longest} plies, {path} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
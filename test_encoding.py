@@ -0,0 +1,129 @@
+"""
+Checks of the FEN and to_bytes encodings of board.Board, its copies and the shared pieces
+
+Examples:
+    python -m unittest test_encoding
+"""
+from board import *
+from perft import POSITIONS
+import copy
+import pickle
+import unittest
+
+FENS: list[str] = [fen for fen, _ in POSITIONS.values()]
+
+
+def get_fields(fen: str) -> str:
+    """The fields of a FEN that to_fen writes back, the move counters are always 0 1"""
+    return " ".join(fen.split()[:4])
+
+
+class FenTest(unittest.TestCase):
+    def test_round_trip(self):
+        for fen in FENS:
+            self.assertEqual(get_fields(Board(fen).to_fen()), get_fields(fen))
+            self.assertEqual(Board(fen).to_fen(), Board(Board(fen).to_fen()).to_fen())
+
+    def test_short_fen(self):
+        self.assertEqual(
+            Board("8/8/8/8/8/8/8/K1k5").to_fen(), "8/8/8/8/8/8/8/K1k5 w - - 0 1"
+        )
+
+    def test_rights_need_their_pieces(self):
+        board = Board("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1")
+        self.assertEqual(board.to_fen(), "r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1")
+
+    def test_en_passant_needs_its_pawn(self):
+        board = Board("4k3/8/8/8/8/8/8/4K3 w - e6 0 1")
+        self.assertIsNone(board.jumped_pos)
+        board = Board("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1")
+        self.assertEqual(board.jumped_pos, "d5")
+        self.assertIn(("e5", "d6", None), board.get_moves())
+
+    def test_bad_placement(self):
+        for placement in ("8/8/8/8/8/8/8/K1k4", "8/8/8/8/8/8/8/K1k6", "8/8/8/8/8/8/8"):
+            with self.assertRaises(ValueError, msg=placement):
+                Board(placement + " w - - 0 1")
+
+
+class BytesTest(unittest.TestCase):
+    def assert_same(self, board: Board, loaded: Board) -> None:
+        self.assertEqual(loaded.to_fen(), board.to_fen())
+        self.assertEqual(loaded.to_bytes(), board.to_bytes())
+        self.assertEqual(loaded.hash, board.hash)
+
+    def test_round_trip(self):
+        for fen in FENS:
+            board = Board(fen)
+            data: bytes = board.to_bytes()
+            self.assertEqual(len(data), ENCODED_SIZE)
+            self.assert_same(board, Board.from_bytes(data))
+
+    def test_header(self):
+        self.assertEqual(Board(START_FEN).to_bytes()[0], 0b11110)
+        self.assertEqual(Board("8/8/8/8/8/8/8/K1k5 b - - 0 1").to_bytes()[0], 1)
+        turn, rights, nibbles = decode_position(Board(START_FEN).to_bytes())
+        self.assertEqual((turn, rights), (Color.WHITE, 15))
+        self.assertEqual(nibbles.count(0), 32)
+
+    def test_every_move(self):
+        """Each position one move away from the reference ones survives the round trips"""
+        for fen in FENS:
+            board = Board(fen)
+            before: bytes = board.to_bytes()
+            for move in board.get_moves():
+                undo: Undo = board.make_move(*move)
+                self.assertEqual(board.hash, board.compute_hash(), move)
+                self.assert_same(board, Board.from_bytes(board.to_bytes()))
+                self.assert_same(board, Board(board.to_fen()))
+                board.unmake_move(undo)
+                self.assertEqual(board.to_bytes(), before, move)
+
+    def test_loaded_board_builds_once_used(self):
+        board = Board(
+            "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+        )
+        reference: list[tuple] = sorted(board.get_moves(), key=str)
+        loaded = Board.from_bytes(board.to_bytes())
+        self.assertTrue(loaded.needs_rebuild)
+        self.assertEqual(loaded.hash, board.hash)
+        self.assertTrue(loaded.needs_rebuild)  # The hash needs no tables
+        self.assertEqual(sorted(loaded.get_moves(), key=str), reference)
+        self.assertFalse(loaded.needs_rebuild)
+        self.assertEqual(loaded.get_score(), board.get_score())
+
+
+class CopyTest(unittest.TestCase):
+    def test_copy_is_independent(self):
+        board = Board()
+        board.update("e2", "e4")
+        fen: str = board.to_fen()
+        copied: Board = board.copy()
+        self.assertEqual(copied.to_bytes(), board.to_bytes())
+        self.assertEqual(copied.hash, board.hash)
+        copied.make_move("e7", "e5")
+        self.assertIsNone(board.get_piece("e5"))
+        self.assertEqual(board.to_fen(), fen)
+        self.assertEqual(copied.history, [])
+
+    def test_pieces_are_shared(self):
+        for fen in FENS:
+            for board in (Board(fen), Board.from_bytes(Board(fen).to_bytes())):
+                for piece in board.squares:
+                    if piece is not None:
+                        self.assertIs(piece, get_shared_piece(type(piece), piece.color))
+        self.assertIs(Board().squares[0], Board().copy().squares[0])
+
+    def test_pieces_are_immutable(self):
+        piece: Piece = get_shared_piece(Queen, Color.WHITE)
+        with self.assertRaises(AttributeError):
+            piece.color = Color.BLACK
+        with self.assertRaises(AttributeError):
+            piece.moved = True
+        self.assertIs(copy.copy(piece), piece)
+        self.assertIs(copy.deepcopy(piece), piece)
+        self.assertIs(pickle.loads(pickle.dumps(piece)), piece)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Checks of the PGN reader and the SAN parser of pgn.py
+
+Examples:
+    python -m unittest test_pgn
+"""
+from pgn import *
+import unittest
+
+# After 1. e4 d5: the e4 pawn can take on d5 or push to e5
+SCANDINAVIAN_FEN = "rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2"
+# After 1. e4 d5 2. e5 f5: exf6 is an en passant capture
+EN_PASSANT_FEN = "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3"
+# Both white knights reach d2, and the b7 pawn can promote on b8 or take on a8
+KNIGHTS_FEN = "r3k3/1P6/8/8/8/8/8/1N2KN2 w - - 0 1"
+CASTLING_FEN = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+
+
+class ParseSanTest(unittest.TestCase):
+    def assert_move(self, fen: str, san: str, move: tuple) -> None:
+        self.assertEqual(parse_san(Board(fen), san), move, san)
+
+    def assert_illegal(self, fen: str, san: str) -> None:
+        with self.assertRaises(IllegalMoveError, msg=san):
+            parse_san(Board(fen), san)
+
+    def test_pawn_moves(self):
+        self.assert_move(START_FEN, "e4", ("e2", "e4", None))
+        self.assert_move(SCANDINAVIAN_FEN, "e5", ("e4", "e5", None))
+        self.assert_move(SCANDINAVIAN_FEN, "exd5", ("e4", "d5", None))
+        self.assert_move(SCANDINAVIAN_FEN, "exd5+!?", ("e4", "d5", None))
+
+    def test_pawn_capture_needs_x(self):
+        self.assert_illegal(SCANDINAVIAN_FEN, "d5")
+        self.assert_illegal(SCANDINAVIAN_FEN, "ed5")
+        self.assert_illegal(EN_PASSANT_FEN, "f6")
+        self.assert_illegal(START_FEN, "exe4")
+
+    def test_en_passant(self):
+        for san in ("exf6", "exf6e.p.", "exf6 e.p.", "exf6e.p.+"):
+            self.assert_move(EN_PASSANT_FEN, san, ("e5", "f6", None))
+
+    def test_castling(self):
+        for san in ("O-O", "0-0"):
+            self.assert_move(CASTLING_FEN, san, ("e1", "g1", None))
+        for san in ("O-O-O", "0-0-0"):
+            self.assert_move(CASTLING_FEN, san, ("e1", "c1", None))
+        self.assert_illegal(KNIGHTS_FEN, "O-O")
+
+    def test_disambiguation(self):
+        self.assert_illegal(KNIGHTS_FEN, "Nd2")
+        self.assert_move(KNIGHTS_FEN, "Nbd2", ("b1", "d2", None))
+        self.assert_move(KNIGHTS_FEN, "Nfd2", ("f1", "d2", None))
+        self.assert_move(KNIGHTS_FEN, "Nf1d2", ("f1", "d2", None))
+
+    def test_promotion(self):
+        self.assert_move(KNIGHTS_FEN, "b8=Q", ("b7", "b8", Queen))
+        self.assert_move(KNIGHTS_FEN, "bxa8N", ("b7", "a8", Knight))
+        self.assert_illegal(KNIGHTS_FEN, "b8")
+        self.assert_illegal(KNIGHTS_FEN, "b8=K")
+        self.assert_illegal(START_FEN, "e4=Q")
+
+    def test_unreadable(self):
+        for san in ("", "e9", "Xe4", "e4e5"):
+            with self.assertRaises(IllegalMoveError, msg=san):
+                parse_san(Board(), san)
+
+
+class ReadGamesTest(unittest.TestCase):
+    def test_skips_comments_variations_and_annotations(self):
+        lines = [
+            '[Event "Test"]\n',
+            '[White "A \\"B\\" C"]\n',
+            "\n",
+            "1. e4 {best by test} e5 (1... c5 2. Nf3 (2. c3)) 2. Nf3 $1 Nc6 ; a comment\n",
+            "3... a6?! 4. exf6 e.p. 1-0\n",
+        ]
+        games = list(read_games(lines))
+        self.assertEqual(len(games), 1)
+        self.assertEqual(games[0].headers, {"Event": "Test", "White": 'A "B" C'})
+        self.assertEqual(games[0].moves, ["e4", "e5", "Nf3", "Nc6", "a6?!", "exf6"])
+        self.assertEqual(games[0].result, "1-0")
+
+    def test_games_without_a_result(self):
+        lines = ['[Result "0-1"]\n', "1. d4\n", '[Result "*"]\n', "1. c4\n"]
+        games = list(read_games(lines))
+        self.assertEqual([game.moves for game in games], [["d4"], ["c4"]])
+        self.assertEqual([game.result for game in games], ["0-1", "*"])
+
+    def test_replay(self):
+        game = next(read_games(["1. f3 e5 2. g4 Qh4# 0-1\n"]))
+        plies = 0
+        for _, board, _ in replay(game):
+            plies += 1
+        # The loop ends once replay has played the last move too
+        self.assertEqual(plies, 4)
+        self.assertTrue(board.get_status().checkmate)
+
+    def test_replay_names_the_illegal_ply(self):
+        game = next(read_games(["1. e4 e5 2. Ke3 *\n"]))
+        with self.assertRaisesRegex(IllegalMoveError, "ply 3"):
+            list(replay(game))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Checks of the transposition table and of the legal move cache that boards share through it
+
+Examples:
+    python -m unittest test_transposition
+"""
+from board import *
+from perft import POSITIONS
+from transposition import TranspositionTable
+import threading
+import unittest
+
+# Keys of one bucket of a table of 8 slots
+A, B, C = 8, 16, 24
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = TranspositionTable(8)
+
+    def test_size(self):
+        self.assertEqual(len(TranspositionTable(8).entries), 8)
+        self.assertEqual(len(TranspositionTable(100).entries), 64)
+        self.assertEqual(len(TranspositionTable(1).entries), 2)
+
+    def test_round_trip(self):
+        self.assertIsNone(self.table.get(A))
+        self.table.store(A, "a", 3)
+        self.table.store(1, "one")
+        self.assertEqual(self.table.get(A), "a")
+        self.assertEqual(self.table.get(A, 3), "a")
+        self.assertEqual(self.table.get(1), "one")
+        self.assertEqual(len(self.table), 2)
+
+    def test_shallower_lookup_misses(self):
+        self.table.store(A, "a", 3)
+        self.assertIsNone(self.table.get(A, 4))
+        self.assertEqual((self.table.hits, self.table.misses), (0, 1))
+        self.assertEqual(self.table.get(A, 2), "a")
+        self.assertEqual(self.table.hit_rate, 0.5)
+
+    def test_deepest_keeps_the_first_slot(self):
+        self.table.store(A, "a", 5)
+        self.table.store(B, "b", 2)
+        self.table.store(C, "c", 3)  # Replaces b, a stays
+        self.assertEqual(self.table.get(A), "a")
+        self.assertIsNone(self.table.get(B))
+        self.assertEqual(self.table.get(C), "c")
+
+    def test_deeper_result_moves_the_first_slot_down(self):
+        self.table.store(A, "a", 2)
+        self.table.store(B, "b", 5)
+        self.assertEqual(self.table.entries[0], (B, 5, "b"))
+        self.assertEqual(self.table.entries[1], (A, 2, "a"))
+
+    def test_same_key_keeps_the_deeper_result(self):
+        self.table.store(A, "a5", 5)
+        self.table.store(A, "a2", 2)
+        self.assertEqual(self.table.get(A), "a5")
+
+        # The same in the second slot, under a deeper first slot
+        self.table.store(B, "b9", 9)
+        self.table.store(A, "a3", 3)
+        self.assertEqual(self.table.entries[1], (A, 5, "a5"))
+        self.table.store(A, "a7", 7)
+        self.assertEqual(self.table.entries[1], (A, 7, "a7"))
+
+    def test_a_key_is_in_one_slot(self):
+        self.table.store(A, "a1", 1)
+        self.table.store(B, "b4", 4)  # a1 moves to the second slot
+        self.table.store(A, "a6", 6)  # b4 moves there instead
+        self.assertEqual(self.table.entries[:2], [(A, 6, "a6"), (B, 4, "b4")])
+        self.table.store(B, "b8", 8)
+        self.assertEqual(self.table.entries[:2], [(B, 8, "b8"), (A, 6, "a6")])
+
+    def test_clear(self):
+        self.table.store(A, "a")
+        self.table.get(A)
+        self.table.clear()
+        self.assertEqual(len(self.table), 0)
+        self.assertEqual((self.table.hits, self.table.misses), (0, 0))
+
+
+class LegalMoveCacheTest(unittest.TestCase):
+    def get_pairs(self, board: Board) -> list[tuple[str]]:
+        """The (pos, target) moves of get_turn_moves, which go through Board.cache"""
+        return sorted(
+            (pos, target)
+            for pos, targets in board.get_turn_moves().items()
+            for target in targets
+        )
+
+    def test_threads_share_the_cache(self):
+        fens: list[str] = [fen for fen, _ in POSITIONS.values()]
+        # get_moves works the moves out without the cache
+        expected: list[list[tuple[str]]] = [
+            sorted({move[:2] for move in Board(fen).get_moves()}) for fen in fens
+        ]
+        Board.cache.clear()
+        results: list[list[list[tuple[str]]]] = []
+
+        def work() -> None:
+            results.append([self.get_pairs(Board(fen)) for fen in fens])
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [expected] * 4)
+        self.assertGreater(Board.cache.hits, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Fixed-size table of results keyed by the Zobrist hash of a position"""
+from typing import Any, Union
+
+
+class TranspositionTable:
+    """
+    A hash table with a fixed number of slots grouped in buckets of two.
+    - The first slot of a bucket keeps the deepest result stored for it.
+    - The second slot takes the newest shallower result, or the result the first slot gave up.
+    Each slot holds a (key, depth, value) tuple, so a slot is replaced in one step.
+    """
+
+    def __init__(self, size: int = 1 << 16) -> None:
+        """size is rounded down to a power of two"""
+        size = 1 << max(size.bit_length() - 1, 1)
+        self.mask: int = (size - 1) & ~1
+        self.entries: list[Union[tuple, None]] = [None] * size
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.entries) - self.entries.count(None)
+
+    def get(self, key: int, depth: int = 0) -> Any:
+        """Return the value stored for key at the given depth or deeper, None if there is none"""
+        slot = key & self.mask
+        for entry in (self.entries[slot], self.entries[slot + 1]):
+            if entry is not None and entry[0] == key and entry[1] >= depth:
+                self.hits += 1
+                return entry[2]
+        self.misses += 1
+        return None
+
+    def store(self, key: int, value: Any, depth: int = 0) -> None:
+        """
+        - Store value for key, keeping the deeper result in the first slot of the bucket
+        - A key is only ever in one slot: a shallower result of a key that is stored deeper, in
+          either slot, is dropped
+        """
+        slot = key & self.mask
+        first: Union[tuple, None] = self.entries[slot]
+        second: Union[tuple, None] = self.entries[slot + 1]
+        entry: tuple = (key, depth, value)
+        if first is not None and depth < first[1]:
+            if first[0] != key and (
+                second is None or second[0] != key or depth >= second[1]
+            ):
+                self.entries[slot + 1] = entry
+            return
+        self.entries[slot] = entry
+        if first is not None and first[0] != key:
+            self.entries[slot + 1] = first  # The deepest result so far keeps a place
+        elif second is not None and second[0] == key:
+            self.entries[slot + 1] = None
+
+    def clear(self) -> None:
+        self.entries = [None] * len(self.entries)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0